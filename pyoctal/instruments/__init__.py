@@ -1,62 +1,55 @@
 """
 Import all instruments here to shorten the imports
+
+The drivers are only imported on first access, i.e.
+`from pyoctal.instruments import AgilentE3640A` does not import the
+other drivers and their dependencies.
 """
+import importlib
 import sys
 
 __platform__ = ("cygwin", "win32") # Windows OS system
 
+# driver name -> module defining it
+_drivers = {
+    "Agilent8163B": ".agilent816xB",
+    "Agilent8164B": ".agilent816xB",
+    "AgilentE3640A": ".agilentE3640",
+    "AgilentDSO8000": ".agilentDSO8000",
+    "AmetekDSP7230": ".ametekDSP72XX",
+    "AmetekDSP7265": ".ametekDSP72XX",
+    "Arroyo6301": ".arroyo6301",
+    "DaylightQCL": ".daylightQCL",
+    "EXFOXTA50": ".exfoXTA50",
+    "FiberlabsAMP": ".fiberlabsAMP",
+    "Keithley2400": ".keithley2400",
+    "Keithley6487": ".keithley6487",
+    "Keysight86100D": ".keysight86100D",
+    "KeysightE8257D": ".keysightE8257D",
+    "TektronixScope": ".tektronixScope",
+    "ThorlabsITC4002QCL": ".thorlabsITC40XX",
+    "ThorlabsPM100": ".thorlabsPM100",
+    "TTiTGF3162": ".ttiTGF3162",
+    "KeysightFlexDCA": ".keysight86100D",
+}
 
-from .agilent816xB import Agilent8163B, Agilent8164B
-from .agilentE3640 import AgilentE3640A
-from .agilentDSO8000 import AgilentDSO8000
-
-from .ametekDSP72XX import AmetekDSP7230, AmetekDSP7265
-
-from .arroyo6301 import Arroyo6301
-
-from .daylightQCL import DaylightQCL
-
-from .exfoXTA50 import EXFOXTA50
-
-from .fiberlabsAMP import FiberlabsAMP
-
-from .keithley2400 import Keithley2400
-from .keithley6487 import Keithley6487
-
-from .keysight86100D import Keysight86100D, KeysightFlexDCA
-from .keysightE8257D import KeysightE8257D
+# Windows OS specific modules
+if sys.platform in __platform__:
+    _drivers.update({
+        "KeysightILME": ".keysightPAS",
+        "ThorlabsAPT": ".thorlabsAPT",
+    })
 
-from .tektronixScope import TektronixScope
+__all__ = list(_drivers)
 
-from .thorlabsITC40XX import ThorlabsITC4002QCL
-from .thorlabsPM100 import ThorlabsPM100
 
-from .ttiTGF3162 import TTiTGF3162
+def __getattr__(name: str):
+    if name not in _drivers:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    cls = getattr(importlib.import_module(_drivers[name], __package__), name)
+    globals()[name] = cls # only resolve once
+    return cls
 
-__all__ = [
-        "Agilent8163B",
-        "Agilent8164B",
-        "AgilentE3640A",
-        "AgilentDSO8000",
-        "AmetekDSP7230",
-        "AmetekDSP7265",
-        "Arroyo6301",
-        "DaylightQCL",
-        "EXFOXTA50",
-        "FiberlabsAMP",
-        "Keithley2400",
-        "Keithley6487",
-        "Keysight86100D",
-        "KeysightE8257D",
-        "TektronixScope",
-        "ThorlabsITC4002QCL",
-        "ThorlabsPM100",
-        "TTiTGF3162",
-        "KeysightFlexDCA",
-    ]
 
-# Windows OS specific modules
-if sys.platform in __platform__:
-    from .keysightPAS import KeysightILME
-    from .thorlabsAPT import ThorlabsAPT
-    __all__.extend(["KeysightILME", "ThorlabsAPT"])
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,33 +1,21 @@
-from typing import Union, List, Tuple
-import sys
+from contextlib import contextmanager
+from typing import Iterator, Union, List, Tuple
 import time
+import warnings
 
 import numpy as np
-from scipy.signal import find_peaks
 
-from pyoctal.instruments.base import BaseInstrument
-from pyoctal.utils.error import PARAM_INVALID_ERR, error_message
-
-
-def resonances(data: np.array, cutoff: float, distance: int) -> List:
-    """ 
-    Find the resonances in the spectrum. 
-    
-    Parameters
-    ----------
-    cutoff: float
-        The cutoff value to find the resonances
-    distance: int
-        The minimum distance between each peak
-
-    Returns
-    -------
-    List
-        The resonances found in the spectrum
-    """
-    peaks, _ = find_peaks(data, distance=distance)
-    peaks = peaks[data[peaks] - min(data) > cutoff]
-    return peaks
+from pyoctal.instruments.base import BaseInstrument, cached_query
+from pyoctal.utils.error import PARAM_INVALID_ERR, PARAM_OUT_OF_RANGE_ERR, error_message
+from pyoctal.utils.resonance import ( # resonances is kept importable from this module
+    ResonanceSearch, fit_minimum, fit_lorentzians, resonances
+)
+from pyoctal.utils.spectrum import (
+    RunningStats, SweepAverage, choose_ranges, outlier_cycles, plan_segments,
+    stitch_ranges, stitch_segments
+)
+from pyoctal.utils.timeseries import DecimatedSummary, TimeSeriesWriter
+from pyoctal.utils.util import SettleDetector, watt_to_dbm
 
 
 class Agilent816xB(BaseInstrument):
@@ -49,6 +37,21 @@ class Agilent816xB(BaseInstrument):
     sens_chan: int
         Sensor channel
     """
+    # the instrument changes these states by itself once a sweep or logging completes
+    shadow_exclude = ("wavelength:sweep:state", "function:state", "lock")
+    binary_chunk_size = 1024*1024 # logging results are up to 100k+ points
+    sweep_timeout = 30 # extra time allowed for a sweep to complete [s]
+    max_log_points = 100000 # logging memory of the detector
+    min_sweep_step = 0.1 # [pm]
+    log_avgtime = 1e-04 # detector averaging time of a logging sweep [s]
+    detect_ranges = (10, 0, -10, -20, -30, -40, -50, -60, -70) # [dBm]
+    srq_supported = True # GPIB and USB connections signal *OPC with a service request
+    shadow_coupling = {
+        "wavelength:sweep:state": ("wavelength:fixed",),
+        "power:range": ("power:range:auto",),
+        "power:range:auto": ("power:range",),
+    }
+
     def __init__(self, addr: str, rm, src_num: int,
                  src_chan: int, sens_num: int, sens_chan: int):
         super().__init__(rsc_addr=addr, rm=rm)
@@ -58,10 +61,14 @@ class Agilent816xB(BaseInstrument):
         self.sens_chan = sens_chan
         self.laser = f"source{self.src_num}:channel{self.src_chan}"
         self.detect = f"sense{self.sens_num}:channel{self.sens_chan}"
+        self.settle = SettleDetector() # learns how long the detector takes to settle
 
     def setup(self, reset: bool, wavelength: float=1550,
-              power: float=10, period: float=200e-03):
-        """ Make waveguide alignment easier for users """
+              power: float=10, period: float=200e-03, autorange: bool=True):
+        """
+        Make waveguide alignment easier for users. If autorange is false,
+        the detector range is locked to the power measured at the end.
+        """
         if reset:
             self.reset()
 
@@ -76,15 +83,56 @@ class Agilent816xB(BaseInstrument):
         if not self.get_laser_state():
             self.unlock("1234")
             self.set_laser_state(1)
+        if not autorange:
+            self.lock_range()
+
+    def lock_range(self, prange: float=None, headroom: float=3) -> float:
+        """
+        Fix the detector power range, so that no time is spent autoranging.
+
+        Parameters
+        ----------
+        prange: float
+            The power range [dBm]. If not provided, the most sensitive range
+            above the power currently measured is used.
+        headroom: float
+            The margin kept above the power currently measured [dB]
+
+        Returns
+        -------
+        float
+            The power range [dBm]
+        """
+        if prange is None:
+            self.set_detect_autorange(1)
+            power = watt_to_dbm(self.get_detect_pow())
+            prange = choose_ranges(power, power, self.detect_ranges, headroom=headroom)[0]
+        with self.batch():
+            self.set_detect_autorange(0)
+            self.set_detect_prange(prange)
+        return prange
+
+    @contextmanager
+    def sensor(self, num: int, chan: int):
+        """ Direct the detector commands to another sensor within the block. """
+        prev = (self.sens_num, self.sens_chan)
+        self.sens_num, self.sens_chan = num, chan
+        self.detect = f"sense{num}:channel{chan}"
+        try:
+            yield self
+        finally:
+            self.sens_num, self.sens_chan = prev
+            self.detect = f"sense{self.sens_num}:channel{self.sens_chan}"
 
     def unlock(self, code: str):
         """ Unlock the instrument with a code. """
         self.write(f"lock 0,{code}") # code = 1234
 
     def set_wavelength(self, wavelength: float):
-        """ Set both laser and detector wavelength [nm]. """
+        """ Set both laser and detector wavelength [nm] and wait for the laser to get there. """
         self.set_detect_wav(wavelength)
         self.set_laser_wav(wavelength)
+        self.wait_opc(timeout=self.sweep_timeout) # the wavelength change is overlapped
 
     def set_unit(self, source: str, sensor: str):
         """ Set the power unit of the laser and detector. """
@@ -129,8 +177,8 @@ class Agilent816xB(BaseInstrument):
         elif mode in ("minmax", "minm"): # params = [mode, data_pts]
             self.write(f"{self.detect}:function:parameter:minmax {params[0]},{params[1]}")
         elif mode in ("stability", "stab"): # params = [total_time, period, avg_time]
-            self.write(f"{self.detect}:function:parameter \
-                       :stability {params[0]}s,{params[1]}s,{params[2]}s")
+            self.write(f"{self.detect}:function:parameter:stability "
+                       f"{params[0]}s,{params[1]}s,{params[2]}s")
         else:
             raise ValueError(
                 f"Error code {PARAM_INVALID_ERR:x}: {error_message[PARAM_INVALID_ERR]}"
@@ -141,6 +189,10 @@ class Agilent816xB(BaseInstrument):
         """ Get the detector power. """
         return self.query_float(f"read{self.sens_num}:channel{self.sens_chan}:power?")
 
+    def get_detect_avgtime(self) -> float:
+        """ Get the detector average time [s]. """
+        return self.query_float(f"{self.detect}:power:atime?")
+
     def get_trigno(self) -> int:
         """ Get the detector trigger number. """
         return int(self.query("source:channel:wavelength:sweep:exp?"))
@@ -150,14 +202,14 @@ class Agilent816xB(BaseInstrument):
         rsp = self.query(f"{self.detect}:function:state?")
         return rsp.lower()
 
-    def get_detect_func_result(self) -> List:
+    def get_detect_func_result(self) -> np.ndarray:
         """ Get the detector function result. """
-        return self.query_binary_values(f"{self.detect}:function:result?")
+        return self.query_binary_array(f"{self.detect}:function:result?", datatype="f")
 
-    def get_detect_func_result_block(self, offset: int, dpts: int) -> List:
-        """ Get the detector function result. """
-        return self.query_binary_values(
-            f"{self.detect}:function:result:block? {offset},{dpts}", datatype="d"
+    def get_detect_func_result_block(self, offset: int, dpts: int) -> np.ndarray:
+        """ Get dpts points of the detector function result from offset. """
+        return self.query_binary_array(
+            f"{self.detect}:function:result:block? {offset},{dpts}", datatype="f"
         )
 
     ### LASER COMMANDS ###################################
@@ -181,9 +233,9 @@ class Agilent816xB(BaseInstrument):
         """ Set the laser unit. """
         self.write(f"{self.laser}:power:unit {unit}") # set the source unit in dBm
 
-    def get_laser_data(self, mode: str) -> List:
+    def get_laser_data(self, mode: str) -> np.ndarray:
         """ Get the laser data. """
-        return self.query_binary_values(f"{self.laser}:read:data? {mode}", datatype="d")
+        return self.query_binary_array(f"{self.laser}:read:data? {mode}", datatype="d")
 
     def get_laser_points(self, mode: str) -> int:
         """ Get the laser data points. """
@@ -193,10 +245,12 @@ class Agilent816xB(BaseInstrument):
         """ Get the laser output state. """
         self.query_bool(f"{self.laser}:power:state?")
 
+    @cached_query()
     def get_laser_wav_min(self) -> float:
         """ Get the laser's minimum wavelength. """
         return self.query_float(f"{self.laser}:wavelength? MIN")
 
+    @cached_query()
     def get_laser_wav_max(self) -> float:
         """ Get the laser's maximum wavelength. """
         return self.query_float(f"{self.laser}:wavelength? MAX")
@@ -222,11 +276,20 @@ class Agilent816xB(BaseInstrument):
         """ Specify when an output trigger is generated. """
         return self.query("trigger:output?")
 
+    def get_trig_config(self) -> str:
+        """ Get the configuration of trigger. """
+        return self.query("trigger:conf?")
+
     def set_trig_responses(self, num: int, chan: int, in_rsp: str, out_rsp: str):
         """ Set the laser trigger response. """
         self.write(f"trigger{num}:channel{chan}:input {in_rsp}")
         self.write(f"trigger{num}:channel{chan}:output {out_rsp}")
 
+    def get_trig_responses(self, num: int, chan: int) -> Tuple[str, str]:
+        """ Get the input and output trigger responses. """
+        return (self.query(f"trigger{num}:channel{chan}:input?"),
+                self.query(f"trigger{num}:channel{chan}:output?"))
+
     ### SWEEP COMMANDS ####################################
     def set_sweep_mode(self, mode: str): # STEP, MAN, CONT
         """ Set the sweep mode. """
@@ -283,69 +346,208 @@ class Agilent816xB(BaseInstrument):
         return int(self.query(f"{self.laser}:wavelength:sweep:exp?"))
     
     def find_resonance(self, srange: float=1e-09) -> float:
-        """ Find the resonance wavelength based on the current wavelength. """
-        curr_wav = self.get_laser_wav()
-
-        # quick search for the resonance by finding the minimum
-        # power value within the range of the current wavelength
-        powers = []
-        search_wavelengths = np.linspace(curr_wav-srange*2/3, curr_wav+srange*1/3, num=int(srange//5e-10+1))*1e+09
-        for wavelength in search_wavelengths:
-            self.set_wavelength(wavelength)
-            powers.append(self.get_detect_pow())
-        arg = np.argmin(powers)
+        """ Find the resonance wavelength [nm] based on the current wavelength. """
+        return self.search_resonance(span=srange*1e+09).wavelength
 
-        if arg == 0 or arg == len(powers)-1:
-            print(powers)
-            print("Warning: Resonance not found. Please adjust the search range.")
+    def search_resonance(self, center: float=None, span: float=1.0, points: int=201,
+                         tol: float=1e-03, max_sweeps: int=3, speed: float=5,
+                         session: "LaserSweepSession"=None) -> ResonanceSearch:
+        """
+        Find a resonance dip with short logging sweeps.
 
-        return search_wavelengths[arg]
+        A coarse sweep over the span locates the dip with sub-sample
+        accuracy. While the uncertainty is above tol, a narrower sweep
+        around the estimate refines it. The laser and the detector are
+        left at the resonance.
 
+        Parameters
+        ----------
+        center: float
+            The centre of the search [nm]. Default to the current laser wavelength.
+        span: float
+            The search range [nm]
+        points: int
+            The number of points per sweep
+        tol: float
+            The required accuracy [nm]
+        max_sweeps: int
+            The maximum number of sweeps
+        speed: float
+            The speed of sweep [nm/s]
+        session: LaserSweepSession
+            An open session to reuse, i.e. within a bias sweep. Otherwise a
+            session is opened and closed without resetting the instrument,
+            and the detector averaging time and triggers are set back
+            afterwards so that get_detect_pow reads as before.
+
+        Returns
+        -------
+        ResonanceSearch
+            The wavelength [nm], power [W] and uncertainty [nm] of the
+            resonance, with the time taken [s] and the number of sweeps
+        """
+        if max_sweeps < 1:
+            raise ValueError(
+                f"Error code {PARAM_OUT_OF_RANGE_ERR:x}: {error_message[PARAM_OUT_OF_RANGE_ERR]}"
+            )
+        begin = time.perf_counter()
+        if center is None:
+            center = self.get_laser_wav()*1e+09
+        owned = session is None
+        if owned:
+            # the session logs with a short averaging time on the triggers of the laser
+            avgtime = self.get_detect_avgtime()
+            trig_config = self.get_trig_config()
+            trig_rsps = self.get_trig_responses(self.sens_num, self.sens_chan)
+            session = self.sweep_session(reset=False)
+
+        try:
+            for sweeps in range(1, max_sweeps + 1):
+                step = max(span/(points - 1)*1e+03, self.min_sweep_step)
+                session.configure(
+                    start=round(center - span/2, 6), stop=round(center + span/2, 6), step=step,
+                    # the detector cannot log faster than it averages
+                    speed=min(speed, step*1e-03/self.log_avgtime)
+                )
+                wavelengths, powers = session.run()
+                wavelength, power, uncertainty = fit_minimum(wavelengths*1e+09, powers)
+                center = wavelength
+                if np.isinf(uncertainty):
+                    warnings.warn("The resonance has not been found. Please adjust the search range.",
+                                  RuntimeWarning)
+                    break
+                if uncertainty <= tol or step == self.min_sweep_step:
+                    break
+                span = min(span/4, max(20*uncertainty, (points - 1)*self.min_sweep_step*1e-03))
+        finally:
+            if owned:
+                session.close()
+                with self.batch():
+                    self.set_detect_avgtime(avgtime)
+                    self.set_trig_config(trig_config)
+                    self.set_trig_responses(self.sens_num, self.sens_chan, *trig_rsps)
+
+        self.set_wavelength(center)
+        return ResonanceSearch(center, power, uncertainty, time.perf_counter() - begin, sweeps)
 
 
     # Complicated functions
     def run_sweep_manual(self, power: float=10.0, lambda_start: float=1535.0,
-                         lambda_stop: float=1575.0, lambda_step: float=5.0):
-        """ Step through each wavelength purely by changing the output laser wavelength. """
-        lambda_range = (self.get_laser_wav_min(), self.get_laser_wav_min())
-        if lambda_start <= lambda_range[0] and lambda_stop >= lambda_range[1]:
+                         lambda_stop: float=1575.0, lambda_step: float=5.0,
+                         period: float=1e-02) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Step through each wavelength purely by changing the output laser wavelength.
+        Every point is measured as soon as the detector has settled, see self.settle.
+
+        Parameters
+        ----------
+        power: float
+            The laser power [dBm]
+        lambda_start: float
+            The start wavelength [nm]
+        lambda_stop: float
+            The stop wavelength [nm]
+        lambda_step: float
+            The step wavelength [nm]
+        period: float
+            The detector averaging time of one sample [s]
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray, np.ndarray]
+            The wavelengths [nm], the powers [W] and the settle time of every point [s]
+        """
+        lambda_range = (self.get_laser_wav_min()*1e+09, self.get_laser_wav_max()*1e+09)
+        if lambda_start < lambda_range[0] or lambda_stop > lambda_range[1]:
             raise ValueError(
                 f"Wavelength out of range. \
                 Please be within {lambda_range[0]} and {lambda_range[1]}."
             )
 
-        wavelengths = []
-        powers = []
-        self.set_detect_autorange(1)
-        self.set_detect_avgtime(200e-03)
-        self.set_laser_pow(power)
-        self.set_detect_autorange(1)
-
-        for wavelength in range(lambda_start, lambda_stop + lambda_step, lambda_step):
-            tolerance = 0.001 # detector stability tolerance
-            diff = prev_power = sys.maxsize
-            loop_max = 20
+        with self.batch():
+            self.set_detect_autorange(1)
+            self.set_detect_avgtime(period)
+            self.set_laser_pow(power)
 
+        wavelengths = np.arange(lambda_start, lambda_stop + lambda_step/2, lambda_step)
+        powers = np.empty_like(wavelengths)
+        settle_times = np.empty_like(wavelengths)
+        for i, wavelength in enumerate(wavelengths):
             self.set_wavelength(wavelength)
+            powers[i], settle_times[i] = self.settle.wait(self.get_detect_pow)
 
-            # Make sure that the laser power is stabalised
-            for _ in range(loop_max):
-                time.sleep(0.5)
-                detected_power = float(self.get_detect_pow())
-                diff = (detected_power - prev_power)/detected_power
-                prev_power = detected_power
-                if abs(diff) <= tolerance:
-                    break
+        return wavelengths, powers, settle_times
 
-            wavelengths.append(wavelength)
-            powers.append(detected_power)
+    def log_power(self, filename: str, duration: float, avgtime: float=1e-03,
+                  period: float=None, block: int=1000, bins: int=2000,
+                  fsync_interval: float=10.0) -> DecimatedSummary:
+        """
+        Log the detector power over a long time, i.e. for a stability
+        measurement.
 
-            return wavelengths, powers
+        The detector logs blocks of samples on its own and every block is
+        appended to a binary file with the start time of each sample, see
+        pyoctal.utils.timeseries. There is a short gap between the blocks
+        while they are transferred.
 
+        Parameters
+        ----------
+        filename: str
+            The binary file the samples are appended to
+        duration: float
+            The duration of the measurement [s]
+        avgtime: float, default: 1e-03
+            The averaging time of every sample [s]
+        period: float
+            The time between the samples [s]. If given, the stability
+            function is used, otherwise the samples follow one another with
+            the logging function.
+        block: int, default: 1000
+            The number of samples per block
+        bins: int, default: 2000
+            The number of bins of the summary
+        fsync_interval: float, default: 10.0
+            The time between syncs of the file to the disk [s]
+
+        Returns
+        -------
+        DecimatedSummary
+            The min/mean/max summary of the powers [W]
+        """
+        if period is None:
+            mode, spacing, params = "logging", avgtime, (block, avgtime)
+        else:
+            mode, spacing, params = "stability", period, (block*period, period, avgtime)
+
+        with self.batch():
+            self.set_detect_func_mode(mode=(mode, "stop"))
+            self.set_detect_unit(unit="Watt")
+            self.set_trig_responses(self.sens_num, self.sens_chan,
+                                    in_rsp="ignored", out_rsp="disabled")
+            self.set_detect_func_params(mode=mode, params=params)
+
+        summary = DecimatedSummary(bins=bins)
+        with TimeSeriesWriter(filename, fsync_interval=fsync_interval) as writer:
+            end = time.time() + duration
+            try:
+                while time.time() < end:
+                    started = time.time()
+                    self.set_detect_func_mode(mode=(mode, "start"))
+                    self.wait_for(
+                        lambda: not self.get_detect_func_state().endswith("progress"),
+                        delay=block*spacing, timeout=block*spacing + self.sweep_timeout,
+                    )
+                    powers = self.get_detect_func_result()
+                    times = started + np.arange(len(powers))*spacing
+                    writer.append(times, powers)
+                    summary.extend(times, powers)
+            finally:
+                self.set_detect_func_mode(mode=(mode, "stop"))
+        return summary
 
     def run_laser_sweep_auto(self, power: float=None, start: float=1535.0,
                              stop: float=1575.0, step: float=5.0, cycles: int=1,
-                             tavg: float=0, speed: float=5) -> np.array:
+                             tavg: float=0, speed: float=5, autorange: bool=True) -> np.array:
         """ 
         Use internal sweep module to sweep through wavelengths. 
         
@@ -365,75 +567,72 @@ class Agilent816xB(BaseInstrument):
             The number of cycles
         tavg: float
             Averaging time in s
+        autorange: bool, default: True
+            Turn the autorange of the sensor on or off. If None, leave the
+            range as it is.
         
         Return
         ------
-        np.array: 
-            An array of detected laser power
+        Tuple[np.array, np.array]: 
+            The logged wavelengths [m] and the detected laser power [W],
+            split into cycles x points if there are several cycles
         """
-        self.set_unit(source="dBm", sensor="Watt")
-
-        # laser setup
-        if power is None:
-            self.set_laser_pow(power=power)
-        self.set_laser_wav(wavelength=start)
-        self.set_laser_state(state=1)
-        self.set_laser_am_state(0)
-
-        # detector setup
-        self.set_detect_func_mode(mode=("logging", "stop"))
-        self.set_detect_wav(wavelength=1550)
-        self.set_detect_avgtime(period=1e-04)
-        self.set_detect_autorange(1)
-
-        # trigger setup
-        self.set_trig_config(config="loop")
-        self.set_trig_responses(self.src_num, self.src_chan,
-                                in_rsp="ignored", out_rsp="stfinished")
-        self.set_trig_responses(self.sens_num, self.sens_chan,
-                                in_rsp="smeasure", out_rsp="disabled")
-
-        # sweep setup
-        self.set_sweep_mode(mode="continuous")
-        self.set_sweep_repeat_mode(mode="oneway")
-        self.set_sweep_cycles(cycles=cycles)
-        self.set_sweep_tdwell(tdwell=1e-04)
-        self.set_sweep_start_stop(start=start, stop=stop)
-        self.set_sweep_step(step=step)
-        self.set_sweep_speed(speed=speed)
-        self.set_sweep_wav_logging(status=1)
-        trigno = self.get_sweep_trigno()
-
-        self.set_detect_func_params(mode="logging", params=(trigno, tavg))
-        self.set_detect_func_mode(mode=("logging", "start"))
-
-        self.set_sweep_state(state="start")
-
-
-        # wait for the sweep to finish
-        while self.get_sweep_state():
-            continue
-
-        # wait until all points are logged
-        while self.get_laser_points(mode="llogging") < trigno:
-            continue
-
-        wavelengths = self.get_laser_data(mode="llogging")
-
-        # Wait until the detector data acquisition is completed
-        while self.get_detect_func_state().lower().endswith("progress"):
-            time.sleep(0.1)
-
-        powers = self.get_detect_func_result()
-        self.set_detect_func_mode(mode=("logging","stop"))
+        with self.sweep_session(power=power, start=start, stop=stop, step=step,
+                                cycles=cycles, tavg=tavg, speed=speed,
+                                autorange=autorange) as session:
+            return session.run_cycles() if cycles > 1 else session.run()
+
+    def run_laser_sweep_segmented(self, power: float=None, start: float=1500.0,
+                                  stop: float=1600.0, step: float=1.0, speed: float=5,
+                                  tavg: float=0, overlap: float=0.1, autorange: bool=True,
+                                  **kwargs) -> Tuple:
+        """
+        Sweep a span with more points than fit in the logging memory by
+        running overlapping segments back-to-back and stitching them.
 
-        self.reset()
+        Parameters
+        ----------
+        power: float
+            The laser power. If not provided, use the current setting.
+        start: float
+            The start wavelength in nm
+        stop: float
+            The stop wavelength in nm
+        step: float
+            The step wavelength in pm
+        speed: float
+            The speed of sweep in nm/s
+        tavg: float
+            Averaging time in s
+        overlap: float
+            The overlap between the segments in nm
+        autorange: bool, default: True
+            Turn the autorange of the sensors on or off. If None, leave the
+            range as it is.
+        **kwargs:
+            Other LaserSweepSession parameters, i.e. sensors
 
-        return wavelengths, powers
+        Return
+        ------
+        Tuple[np.array, np.array]: 
+            The stitched wavelengths [m] and detected laser power [W]
+        """
+        segments = plan_segments(start, stop, step, max_points=self.max_log_points,
+                                 overlap=overlap, cycles=kwargs.get("cycles", 1))
+        with self.sweep_session(power=power, start=segments[0][0], stop=segments[0][1],
+                                step=step, speed=speed, tavg=tavg, autorange=autorange,
+                                **kwargs) as session:
+            return session.run_segments(segments)
+
+    def sweep_session(self, **kwargs) -> "LaserSweepSession":
+        """
+        Get a sweep session to run repeated sweeps with one configuration.
+        The keyword arguments are passed to LaserSweepSession.
+        """
+        return LaserSweepSession(self, **kwargs)
 
-    def find_op_wavelength(self, db: float, target: float, xrange: float=20e-09, speed: float=5,
-                           step: float=5, cutoff: float=10, distance: float=100,
-                           tol: float=1e-09) -> float:
+    def find_op_wavelength(self, db: float, target: float, xrange: float=20.0, speed: float=5,
+                           step: float=5, cutoff: float=10, distance: float=100) -> float:
         """
         Find the operating wavelength that corresponds to a certain dB point 
         from the maximum power level. This wavelength should be on the lefthand side of the 
@@ -447,46 +646,32 @@ class Agilent816xB(BaseInstrument):
             The target value to find
         xrange: float [nm]
             The range of the wavelength to search.
-            i.e. if xrange = 20e-09, the search range will be target - 10nm to target + 10nm
+            i.e. if xrange = 20, the search range will be target - 10nm to target + 10nm
         step: float [pm]
             The step size of the wavelength search
         speed: float [nm/s]
             The speed of the sweep
-        cutoff: float
-            The cutoff value to find the resonances
+        cutoff: float [dB]
+            The minimum depth of the resonances
         distance: float
-            The minimum distance between each peak
-        tol: float
-            The tolerance value to find the closest wavelength
+            The minimum distance between each resonance in points
             
         Returns
         -------
         float
-            The wavelength that corresponds to the target value
+            The wavelength [nm] that corresponds to the target value
         """
         wavelengths, powers = self.run_laser_sweep_auto(
             start=target-xrange/2, stop=target+xrange/2, step=step, speed=speed)
 
-        # convert to dB so resonances function will work
-        powers = 10*np.log10(powers)
-
-        peak_idxs = resonances(data=powers, cutoff=cutoff, distance=distance)
+        dips = fit_lorentzians(wavelengths*1e+09, powers, db=db, cutoff=cutoff, distance=distance)
+        dips = dips[np.isfinite(dips["op_wavelength"])]
 
-        if len(peak_idxs) == 0:
+        if len(dips) == 0:
             raise ValueError("No resonances found. Please adjust the parameters.")
 
-        # Find the closest wavelength to the target
-        hbd_idx = np.argmin(np.abs(wavelengths[peak_idxs] - target))
-        lbd_idx = peak_idxs(np.where(peak_idxs == hbd_idx)[0][0]-1)
-        powers = powers[lbd_idx:hbd_idx]
-
-        pmax = np.max(powers)
-        ptarget = pmax - db
-
-        # find the rightmost one as it will be on the lefthand side of the resonance
-        target_idx = np.where(np.abs(powers - ptarget) <= tol)[-1] + lbd_idx
-
-        return wavelengths[target_idx]
+        # the resonance closest to the target
+        return dips["op_wavelength"][np.argmin(np.abs(dips["wavelength"] - target))]
 
 class Agilent8163B(Agilent816xB):
     """
@@ -547,3 +732,574 @@ class Agilent8164B(Agilent816xB):
             sens_num=sens_num,
             sens_chan=sens_chan,
         )
+
+
+class LaserSweepSession:
+    """
+    A logging sweep of the 816xB laser that is configured once and
+    triggered repeatedly.
+
+    The units, detector, triggers and sweep are set up when the session is
+    opened. Every run only re-arms the logging function and starts the sweep,
+    and the logged wavelength axis is only read again when the sweep
+    parameters change. The instrument is torn down on exit.
+
+    e.g.
+        with mm.sweep_session(start=1530, stop=1570, step=5) as session:
+            for volt in voltages:
+                pm.set_volt(volt)
+                wavelengths, powers = session.run()
+
+    Parameters
+    ----------
+    mm: Agilent816xB
+        The mainframe with the laser and the detector
+    power: float
+        The laser power [dBm]. If not provided, use the current setting.
+    start: float
+        The start wavelength [nm]
+    stop: float
+        The stop wavelength [nm]
+    step: float
+        The step wavelength [pm]
+    speed: float
+        The speed of sweep [nm/s]
+    cycles: int
+        The number of cycles. The powers of all cycles are logged one
+        after another, see run_cycles.
+    tavg: float
+        Averaging time [s]
+    sensors: List[Tuple[int, int]]
+        The (slot, channel) of every sensor logging the sweep. The powers
+        are returned as a points x sensors array if given, otherwise only
+        the sensor of the mainframe is used.
+    autorange: bool, default: None
+        Turn the autorange of the sensors on or off when the session is
+        opened. If not provided, the range is left as it is, i.e. locked by
+        setup(autorange=False) or lock_range. Sessions used to turn
+        autorange on by default, pass True for sweeps that need it.
+    reset: bool, default: True
+        Reset the instrument on exit
+    """
+    # parameters that change the logged wavelength axis
+    sweep_params = ("start", "stop", "step", "speed", "cycles")
+
+    def __init__(self, mm: Agilent816xB, power: float=None, start: float=1535.0,
+                 stop: float=1575.0, step: float=5.0, speed: float=5, cycles: int=1,
+                 tavg: float=0, sensors: List[Tuple[int, int]]=None, autorange: bool=None,
+                 reset: bool=True):
+        self.mm = mm
+        self.sensors = sensors
+        self.autorange = autorange
+        self.params = {
+            "power": power, "start": start, "stop": stop, "step": step,
+            "speed": speed, "cycles": cycles, "tavg": tavg,
+        }
+        self.trigno = None
+        self.points = None # the points of one cycle
+        self.ranges = None # the locked power ranges [dBm], autorange if None
+        self._reset = reset
+        self._active = False
+        self._started = None
+        self._wavelengths = None
+
+    @property
+    def duration(self) -> float:
+        """ The expected duration of one sweep [s]. """
+        params = self.params
+        return abs(params["stop"] - params["start"])/params["speed"]*params["cycles"]
+
+    @property
+    def channels(self) -> int:
+        """ The number of logging sensors. """
+        return 1 if self.sensors is None else len(self.sensors)
+
+    @property
+    def wavelengths(self) -> np.ndarray:
+        """
+        The logged wavelengths [m] of one cycle, only read once per sweep
+        configuration.
+        """
+        if self._wavelengths is None:
+            self.mm.wait_for(lambda: self.mm.get_laser_points(mode="llogging") >= self.points,
+                             timeout=self.mm.sweep_timeout)
+            self._wavelengths = self.mm.get_laser_data(mode="llogging")[:self.points]
+        return self._wavelengths
+
+    def _each_sensor(self):
+        """ Iterate over the sensors, directing the detector commands to each. """
+        for num, chan in self.sensors or [(self.mm.sens_num, self.mm.sens_chan)]:
+            with self.mm.sensor(num, chan):
+                yield num, chan
+
+    def _combine(self, powers: List[np.ndarray]) -> np.ndarray:
+        """ Combine the powers of every sensor. """
+        return powers[0] if self.sensors is None else np.column_stack(powers)
+
+    def open(self):
+        """ Configure the instrument for the sweeps. """
+        mm = self.mm
+        params = self.params
+
+        # configure everything in as few bus transactions as possible
+        with mm.batch():
+            # laser setup
+            mm.set_laser_unit(unit="dBm")
+            if params["power"] is not None:
+                mm.set_laser_pow(power=params["power"])
+            mm.set_laser_wav(wavelength=params["start"])
+            mm.set_laser_state(state=1)
+            mm.set_laser_am_state(0)
+
+            # detector setup, all sensors measure on the triggers of the laser
+            for num, chan in self._each_sensor():
+                mm.set_detect_unit(unit="Watt")
+                mm.set_detect_func_mode(mode=("logging", "stop"))
+                mm.set_detect_wav(wavelength=1550)
+                mm.set_detect_avgtime(period=mm.log_avgtime)
+                if self.autorange is not None:
+                    mm.set_detect_autorange(int(self.autorange))
+                mm.set_trig_responses(num, chan, in_rsp="smeasure", out_rsp="disabled")
+
+            # trigger setup
+            mm.set_trig_config(config="loop")
+            mm.set_trig_responses(mm.src_num, mm.src_chan,
+                                  in_rsp="ignored", out_rsp="stfinished")
+
+            # sweep setup
+            mm.set_sweep_mode(mode="continuous")
+            mm.set_sweep_repeat_mode(mode="oneway")
+            mm.set_sweep_cycles(cycles=params["cycles"])
+            mm.set_sweep_tdwell(tdwell=1e-04)
+            mm.set_sweep_start_stop(start=params["start"], stop=params["stop"])
+            mm.set_sweep_step(step=params["step"])
+            mm.set_sweep_speed(speed=params["speed"])
+            mm.set_sweep_wav_logging(status=1)
+
+        self._active = True
+        self._wavelengths = None
+        self._set_logging()
+
+    def _set_logging(self):
+        """ Match the number of logged points to the sweep. """
+        self.points = self.mm.get_sweep_trigno()
+        self.trigno = self.points*self.params["cycles"]
+        with self.mm.batch():
+            for _ in self._each_sensor():
+                self.mm.set_detect_func_params(mode="logging",
+                                               params=(self.trigno, self.params["tavg"]))
+
+    def configure(self, **params):
+        """
+        Change the parameters of the following sweeps. Only the settings
+        that changed are sent to an open session.
+        """
+        if set(params) - set(self.params):
+            raise ValueError(
+                f"Error code {PARAM_INVALID_ERR:x}: {error_message[PARAM_INVALID_ERR]}"
+            )
+        changed = {key: val for key, val in params.items() if val != self.params[key]}
+        self.params.update(changed)
+        if not self._active or not changed:
+            return
+
+        mm = self.mm
+        with mm.batch():
+            if changed.get("power") is not None:
+                mm.set_laser_pow(power=changed["power"])
+            if "start" in changed or "stop" in changed:
+                mm.set_laser_wav(wavelength=self.params["start"])
+                mm.set_sweep_start_stop(start=self.params["start"], stop=self.params["stop"])
+            if "step" in changed:
+                mm.set_sweep_step(step=self.params["step"])
+            if "speed" in changed:
+                mm.set_sweep_speed(speed=self.params["speed"])
+            if "cycles" in changed:
+                mm.set_sweep_cycles(cycles=self.params["cycles"])
+
+        if set(changed) & set(self.sweep_params):
+            self._wavelengths = None
+        if set(changed) & set(self.sweep_params + ("tavg",)):
+            self._set_logging()
+
+    def start(self):
+        """ Re-arm the logging and start one sweep without waiting for it. """
+        if not self._active:
+            self.open()
+        with self.mm.batch():
+            for _ in self._each_sensor():
+                self.mm.set_detect_func_mode(mode=("logging", "stop"))
+                self.mm.set_detect_func_mode(mode=("logging", "start"))
+            self.mm.set_sweep_state(state="start")
+        self._started = time.perf_counter()
+
+    def wait(self):
+        """ Wait until the sweep and the logging are complete. """
+        mm = self.mm
+        # only poll once the sweep is expected to be over
+        remaining = max(self._started + self.duration - time.perf_counter(), 0)
+        mm.wait_for(lambda: not mm.get_sweep_state(),
+                    delay=remaining, timeout=remaining + self.duration + mm.sweep_timeout)
+        mm.wait_for(self._logging_done, timeout=mm.sweep_timeout)
+
+    def _logging_done(self) -> bool:
+        """ Check whether every sensor has completed the logging. """
+        states = [self.mm.get_detect_func_state() for _ in self._each_sensor()]
+        return not any(state.endswith("progress") for state in states)
+
+    def fetch(self) -> Tuple[np.ndarray, np.ndarray]:
+        """ Wait for the started sweep and get the wavelengths [m] and powers [W]. """
+        self.wait()
+        return self.wavelengths, self._combine(
+            [self.mm.get_detect_func_result() for _ in self._each_sensor()]
+        )
+
+    def run(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Run one sweep and get the wavelengths [m] and powers [W]. With
+        several locked ranges, one sweep per range is stitched together.
+        """
+        if self.ranges is None or len(self.ranges) == 1:
+            self.start()
+            return self.fetch()
+
+        sweeps = []
+        for prange in self.ranges:
+            self._lock(prange)
+            self.start()
+            wavelengths, powers = self.fetch()
+            sweeps.append(powers)
+        return wavelengths, stitch_ranges(sweeps, self.ranges)
+
+    def run_cycles(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Run one sweep and get the wavelengths [m] and the powers [W] split
+        into cycles x points, with a last axis of sensors if several log.
+        """
+        wavelengths, powers = self.run()
+        return wavelengths, powers.reshape(self.params["cycles"], self.points, *powers.shape[1:])
+
+    def run_averaged(self, repeats: int=1, threshold: float=3.0,
+                     keep: bool=False) -> SweepAverage:
+        """
+        Average every cycle of one or more sweeps. The statistics are
+        accumulated as the sweeps arrive, so only one sweep is held in
+        memory unless the sweeps are kept.
+
+        Parameters
+        ----------
+        repeats: int, default: 1
+            The number of sweeps, each of the configured cycles
+        threshold: float, default: 3.0
+            The cycles of a sweep that deviate more than this from the
+            others are rejected, see outlier_cycles. None keeps all cycles.
+        keep: bool, default: False
+            Return every accepted cycle as well
+
+        Returns
+        -------
+        SweepAverage
+            The wavelengths [m], the mean and the standard deviation of the
+            powers [W], the number of cycles averaged and rejected, and the
+            accepted cycles if kept
+        """
+        stats = RunningStats()
+        rejected = 0
+        sweeps = [] if keep else None
+        for _ in range(repeats):
+            wavelengths, cycles = self.run_cycles()
+            if threshold is not None:
+                outliers = outlier_cycles(cycles, threshold=threshold)
+                rejected += int(outliers.sum())
+                cycles = cycles[~outliers]
+            stats.extend(cycles)
+            if keep:
+                sweeps.append(cycles)
+        if keep:
+            sweeps = np.concatenate(sweeps)
+        return SweepAverage(wavelengths, stats.mean, stats.std, stats.count, rejected, sweeps)
+
+    def _lock(self, prange: float):
+        """ Lock every sensor to a power range [dBm]. """
+        with self.mm.batch():
+            for _ in self._each_sensor():
+                self.mm.lock_range(prange)
+
+    def lock_ranges(self, headroom: float=3, span: float=40, decrement: float=20) -> List[float]:
+        """
+        Pre-scan the sweep with autorange to find the dynamic range of the
+        measurement, then lock the detectors for the following sweeps. When
+        one range cannot cover the dynamic range, every sweep is repeated
+        in several ranges and stitched, see choose_ranges.
+
+        Returns
+        -------
+        List[float]
+            The locked power ranges [dBm]
+        """
+        self.unlock_ranges()
+        _, powers = self.run()
+        powers = watt_to_dbm(powers[powers > 0])
+        self.ranges = choose_ranges(powers.max(), powers.min(), self.mm.detect_ranges,
+                                    span=span, decrement=decrement, headroom=headroom)
+        self._lock(self.ranges[0])
+        return self.ranges
+
+    def unlock_ranges(self):
+        """ Go back to autoranging. """
+        self.ranges = None
+        with self.mm.batch():
+            for _ in self._each_sensor():
+                self.mm.set_detect_autorange(1)
+
+    def run_segments(self, segments: List[Tuple[float, float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Run one sweep per (start, stop) segment [nm] and stitch the results.
+        The segments must overlap, i.e. as planned by plan_segments.
+        """
+        results = []
+        for start, stop in segments:
+            self.configure(start=start, stop=stop)
+            results.append(self.run())
+        return stitch_segments(*zip(*results))
+
+    def logged(self) -> int:
+        """ The number of points logged by the detectors so far. """
+        if self._logging_done():
+            return self.trigno
+        # the detector measures once for every trigger sent by the laser
+        return min(self.mm.get_laser_points(mode="llogging"), self.trigno)
+
+    def stream(self, block: int=10000, out: np.ndarray=None) -> Iterator[np.ndarray]:
+        """
+        Run one sweep and yield the logged powers [W] while the sweep is
+        still running, so the transfer overlaps with the acquisition.
+
+        Parameters
+        ----------
+        block: int, default: 10000
+            The number of points per transfer
+        out: np.ndarray
+            If given, the chunks are also written into it, i.e. a memory-mapped array
+
+        Yields
+        ------
+        np.ndarray
+            The next chunk of powers [W]
+        """
+        self.start()
+        mm = self.mm
+        # poll often enough not to fall behind the acquisition of one block
+        max_interval = max(self.duration*block/self.trigno/2, 1e-02)
+        timeout = self.duration*2 + mm.sweep_timeout
+
+        fetched = 0
+        done = 0
+        while fetched < self.trigno:
+            if done - fetched < min(block, self.trigno - fetched):
+                def ready():
+                    nonlocal done
+                    done = self.logged()
+                    return done - fetched >= min(block, self.trigno - fetched)
+                mm.wait_for(ready, timeout=timeout, max_interval=max_interval)
+
+            dpts = min(block, done - fetched)
+            chunk = self._combine([
+                mm.get_detect_func_result_block(offset=fetched, dpts=dpts)
+                for _ in self._each_sensor()
+            ])
+            if out is not None:
+                out[fetched:fetched + len(chunk)] = chunk
+            fetched += len(chunk)
+            yield chunk
+
+        self.wait()
+
+    def run_to_file(self, filename: str, block: int=10000) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Run one sweep and stream the powers [W] into a .npy file, so long
+        sweeps never need to be held in memory.
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            The wavelengths [m] and the powers [W] memory-mapped from the file
+        """
+        if not self._active:
+            self.open()
+        shape = (self.trigno,) if self.sensors is None else (self.trigno, self.channels)
+        powers = np.lib.format.open_memmap(filename, mode="w+", dtype=np.float32, shape=shape)
+        for _ in self.stream(block=block, out=powers):
+            pass
+        powers.flush()
+        return self.wavelengths, powers
+
+    def stop(self):
+        """ Stop the logging, i.e. to read the detector between sweeps. """
+        with self.mm.batch():
+            for _ in self._each_sensor():
+                self.mm.set_detect_func_mode(mode=("logging", "stop"))
+
+    def close(self):
+        """ Stop the logging and reset the instrument if requested. """
+        if not self._active:
+            return
+        self._active = False
+        self.stop()
+        if self._reset:
+            self.mm.reset()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ResonanceTracker:
+    """
+    Follow a resonance through a bias sweep with narrow logging sweeps.
+
+    The next position of the resonance is predicted from its recent shift,
+    either by a constant velocity Kalman filter or by linear extrapolation,
+    and only a window around the prediction is swept. The window grows
+    with the uncertainty of the prediction and is widened until the
+    resonance is found again whenever the lock is lost.
+
+    e.g.
+        with mm.sweep_session(reset=False) as session:
+            tracker = ResonanceTracker(mm, session, center=1550)
+            for volt in voltages:
+                pm.set_volt(volt)
+                result = tracker.update(volt)
+
+    Parameters
+    ----------
+    mm: Agilent816xB
+        The mainframe with the laser and the detector
+    session: LaserSweepSession
+        The open session running the tracking sweeps
+    center: float
+        The initial resonance wavelength [nm]. Default to the current laser wavelength.
+    window: float, default: 0.2
+        The narrowest tracking window [nm]
+    max_window: float, default: 2.0
+        The widest tracking window [nm], also used to acquire the first lock
+    points: int, default: 101
+        The number of points per sweep
+    tol: float, default: 1e-03
+        The required accuracy [nm]
+    model: str, default: "kalman"
+        The prediction model, either "kalman" or "linear"
+    process_noise: float, default: 1e-03
+        The expected random change of the shift per bias step [nm], only used by the Kalman filter
+    avgtime: float
+        The detector averaging time [s] restored after every search
+    """
+    def __init__(self, mm: Agilent816xB, session: LaserSweepSession, center: float=None,
+                 window: float=0.2, max_window: float=2.0, points: int=101, tol: float=1e-03,
+                 model: str="kalman", process_noise: float=1e-03, avgtime: float=None):
+        if model not in ("kalman", "linear"):
+            raise ValueError(
+                f"Error code {PARAM_INVALID_ERR:x}: {error_message[PARAM_INVALID_ERR]}"
+            )
+        self.mm = mm
+        self.session = session
+        self.center = mm.get_laser_wav()*1e+09 if center is None else center
+        self.window = window
+        self.max_window = max_window
+        self.points = points
+        self.tol = tol
+        self.model = model
+        self.process_noise = process_noise
+        self.avgtime = avgtime
+        self.history = [] # (bias, wavelength [nm]) of every lock
+        self.lost = 0 # the number of times the lock was lost
+        self._state = None # Kalman filter state [wavelength, shift per bias]
+        self._cov = None
+
+    def predict(self, bias: float) -> Tuple[float, float]:
+        """ Predict the resonance wavelength [nm] and its standard deviation [nm] at a bias. """
+        if not self.history:
+            return self.center, self.max_window
+        bias0, wav0 = self.history[-1]
+        if self.model == "linear":
+            # the last lock at another bias, a repeated bias has no shift rate
+            earlier = [lock for lock in self.history if lock[0] != bias0]
+            if not earlier:
+                return wav0, 0
+            bias1, wav1 = earlier[-1]
+            shift = (wav0 - wav1)/(bias0 - bias1)*(bias - bias0)
+            # trust the extrapolation as far as the last shift
+            return wav0 + shift, abs(wav0 - wav1)/2
+
+        if self._state is None: # the shift rate is not known yet
+            return wav0, 0
+        trans, noise = self._transition(bias - bias0)
+        state = trans @ self._state
+        cov = trans @ self._cov @ trans.T + noise
+        return state[0], np.sqrt(cov[0, 0])
+
+    def _transition(self, dbias: float) -> Tuple[np.ndarray, np.ndarray]:
+        """ The state transition and process noise of a bias step. """
+        gain = np.array([dbias/2, 1.0])*dbias # random change of the shift rate
+        return np.array([[1.0, dbias], [0.0, 1.0]]), np.outer(gain, gain)*self.process_noise**2
+
+    def _correct(self, bias: float, wavelength: float, uncertainty: float):
+        """ Add a lock to the history and update the Kalman filter. """
+        meas_var = max(uncertainty, 1e-06)**2
+        if self._state is None:
+            # start from the shift since the last lock at another bias
+            earlier = [lock for lock in self.history if lock[0] != bias]
+            if earlier:
+                bias0, wav0 = earlier[-1]
+                rate = (wavelength - wav0)/(bias - bias0)
+                self._state = np.array([wavelength, rate])
+                self._cov = np.diag([meas_var, 2*meas_var/(bias - bias0)**2])
+        else:
+            trans, noise = self._transition(bias - self.history[-1][0])
+            state = trans @ self._state
+            cov = trans @ self._cov @ trans.T + noise
+            gain = cov[:, 0]/(cov[0, 0] + meas_var)
+            self._state = state + gain*(wavelength - state[0])
+            self._cov = cov - np.outer(gain, cov[0])
+        self.history.append((bias, wavelength))
+
+    def update(self, bias: float=None) -> ResonanceSearch:
+        """
+        Find the resonance at the current bias.
+
+        Parameters
+        ----------
+        bias: float
+            The bias of the device, i.e. the voltage. Default to the number of updates.
+
+        Returns
+        -------
+        ResonanceSearch
+            The resonance found, with inf uncertainty if it was not found
+            within the widest window
+        """
+        bias = len(self.history) if bias is None else bias
+        center, sigma = self.predict(bias)
+        # cover the prediction by +-3 standard deviations
+        span = min(max(6*sigma, self.window), self.max_window)
+
+        result = self.mm.search_resonance(center=center, span=span, points=self.points,
+                                          tol=self.tol, session=self.session)
+        if np.isinf(result.uncertainty):
+            self.lost += 1
+        while np.isinf(result.uncertainty) and span < self.max_window:
+            # lost lock, the lowest point is on the side of the window closest to the resonance
+            span = min(2*span, self.max_window)
+            result = self.mm.search_resonance(center=result.wavelength, span=span,
+                                              points=self.points, tol=self.tol,
+                                              session=self.session)
+
+        self.session.stop()
+        if self.avgtime is not None:
+            self.mm.set_detect_avgtime(period=self.avgtime)
+        if not np.isinf(result.uncertainty):
+            self._correct(bias, result.wavelength, result.uncertainty)
+        return result
@@ -1,5 +1,4 @@
 import sys
-from time import time
 from typing import List
 
 from pyvisa import ResourceManager
@@ -17,6 +16,11 @@ class AgilentE3640A(BaseInstrument):
     rm:
         Pyvisa resource manager
     """
+    shadow_coupling = {
+        "apply": ("voltage", "current"),
+        "voltage": ("apply",),
+        "current": ("apply",),
+    }
 
     def __init__(self, addr: str, rm: ResourceManager):
         super().__init__(rsc_addr=addr, rm=rm)
@@ -71,12 +75,14 @@ class AgilentE3640A(BaseInstrument):
         max_time: float
             The maximum time to wait for the current to be stable.
         """
-        start_time = time()
-        prev_curr = self.get_curr()
-        while True:
+        prev_curr = [self.get_curr()]
+
+        def stable() -> bool:
             curr = self.get_curr()
-            if abs(curr - prev_curr) <= tol:
-                break
-            if time() - start_time > max_time:
-                sys.exit("Timeout: Current did not stabilize.")
-            prev_curr = curr
+            diff, prev_curr[0] = abs(curr - prev_curr[0]), curr
+            return diff <= tol
+
+        try:
+            self.wait_for(stable, timeout=max_time, interval=1e-02, max_interval=0.2)
+        except TimeoutError:
+            sys.exit("Timeout: Current did not stabilize.")
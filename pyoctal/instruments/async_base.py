@@ -0,0 +1,115 @@
+"""
+Asyncio interface on top of the synchronous instrument drivers.
+
+Every blocking call is run in an executor while holding an asyncio.Lock
+shared by all the instruments on the same physical bus. Instruments on
+different buses (i.e. GPIB0 and GPIB1, or GPIB0 and a LAN instrument)
+can therefore be talked to concurrently, while transactions on one bus
+are never interleaved.
+
+e.g.
+    pm1 = AsyncInstrument(AgilentE3640A(addr="GPIB0::5::INSTR", rm=rm))
+    pm2 = AsyncInstrument(AgilentE3640A(addr="GPIB1::6::INSTR", rm=rm))
+    mm = AsyncInstrument(Agilent8164B(addr="TCPIP0::10.0.0.2::INSTR", rm=rm))
+
+    await asyncio.gather(pm1.set_volt(1), pm2.set_volt(2))
+    power = await mm.get_detect_pow()
+"""
+import asyncio
+from concurrent.futures import Executor
+from functools import partial
+from typing import Callable, List
+import weakref
+
+from pyoctal.instruments.base import BaseInstrument
+
+# asyncio locks are bound to a loop, so keep one set of bus locks per loop
+_bus_locks = weakref.WeakKeyDictionary()
+
+
+def bus_key(addr: str) -> str:
+    """
+    Get the physical bus that a resource address communicates through.
+
+    All the devices on a GPIB board share the board, whereas the other
+    interfaces have a dedicated link per device.
+    """
+    addr = addr.upper()
+    intf = addr.split("::")[0]
+    if intf.startswith("GPIB"):
+        return intf if intf != "GPIB" else "GPIB0"
+    return addr
+
+
+class AsyncInstrument:
+    """
+    Asyncio facade of a BaseInstrument.
+
+    Any driver method can be awaited through the facade, i.e.
+    `await instr.set_volt(1)` runs `AgilentE3640A.set_volt(1)`.
+
+    Parameters
+    ----------
+    instr: BaseInstrument
+        The synchronous instrument to wrap
+    executor: Executor, default: None
+        The executor running the blocking calls. Default to the loop's executor.
+    """
+    def __init__(self, instr: BaseInstrument, executor: Executor=None):
+        self._instr = instr
+        self._executor = executor
+        self._bus = bus_key(instr.address)
+
+    @property
+    def instr(self) -> BaseInstrument:
+        return self._instr
+
+    @property
+    def bus(self) -> str:
+        return self._bus
+
+    def _lock(self) -> asyncio.Lock:
+        """ Get the lock of the bus for the running loop. """
+        locks = _bus_locks.setdefault(asyncio.get_running_loop(), {})
+        if self._bus not in locks:
+            locks[self._bus] = asyncio.Lock()
+        return locks[self._bus]
+
+    async def call(self, func: Callable, *args, **kwargs):
+        """ Run a blocking call in the executor once the bus is free. """
+        async with self._lock():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def write(self, cmd: str):
+        """ Write a command. """
+        await self.call(self._instr.write, cmd)
+
+    async def query(self, cmd: str) -> str:
+        """ Query command. """
+        return await self.call(self._instr.query, cmd)
+
+    async def query_float(self, cmd: str) -> float:
+        """ Convert the value return from a query to float. """
+        return await self.call(self._instr.query_float, cmd)
+
+    async def query_binary_values(self, cmd: str, *args, **kwargs) -> List:
+        """ Convert the value return from a query to binary values. """
+        return await self.call(self._instr.query_binary_values, cmd, *args, **kwargs)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._instr, name)
+        if not callable(attr):
+            return attr
+
+        async def method(*args, **kwargs):
+            return await self.call(attr, *args, **kwargs)
+        method.__name__ = name
+        method.__doc__ = attr.__doc__
+        return method
+
+    def __str__(self) -> str:
+        return f"Async {self._instr}"
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._instr!r})"
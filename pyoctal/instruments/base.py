@@ -1,20 +1,36 @@
 from pyvisa import ResourceManager
-from typing import Union, List, Tuple
+from pyvisa.constants import EventType, EventMechanism
+from pyvisa.errors import VisaIOError
+from typing import Union, List, Tuple, Callable
+from contextlib import contextmanager
+from functools import wraps
 import textwrap
 import logging
+import struct
+import time
+import weakref
 
+import numpy as np
+
+from pyoctal.instruments.profiler import CommandProfiler
 from pyoctal.utils.error import (
     error_message,
     RESOURCE_CLASS_UNKNOWN_ERR,
     RESOURCE_ADDR_UNKNOWN_ERR,
     COND_INVALID_ERR,
+    HW_REPORTED_ERR,
     PARAM_OUT_OF_RANGE_ERR,
     PARAM_INVALID_ERR,
     INSTR_NOT_EXIST
 )
+from pyoctal.utils.util import wait_until
 
 logger = logging.getLogger(__name__)
 
+# caches used by the fast connect mode
+_resource_cache = weakref.WeakKeyDictionary() # resource manager -> listed resources
+_identity_cache = weakref.WeakKeyDictionary() # resource manager -> address -> DeviceID
+
 class DeviceID:
     """
     Device identity.
@@ -71,6 +87,41 @@ class DeviceID:
         return self._version
 
 
+def cached_query(ttl: float=None):
+    """
+    Cache the result of a query that does not change during a session.
+
+    The cache is kept per instrument and per set of arguments, and is
+    dropped when the instrument is reset or invalidated.
+
+    e.g.
+        @cached_query(ttl=60)
+        def get_curr_max(self) -> float:
+            return self.query_float("source:current? max")
+
+    Parameters
+    ----------
+    ttl: float
+        Time-to-live of a cached value [s]. Cache forever if None.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            key = (func.__name__, args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            if key in self._query_cache:
+                value, stamp = self._query_cache[key]
+                if ttl is None or now - stamp < ttl:
+                    self._cache_stats["hits"] += 1
+                    return value
+            self._cache_stats["misses"] += 1
+            value = func(self, *args, **kwargs)
+            self._query_cache[key] = (value, now)
+            return value
+        return wrapper
+    return decorator
+
+
 class BaseInstrument:
     """
     A base instrument class containing minimum useful and compatible functions.
@@ -82,12 +133,39 @@ class BaseInstrument:
         It can be either a GPIB, RS232, USB, or an Ethernet address.
     termination: str
         The termination character when pyvisa is communicating with the instrument
+    max_msg_len: int
+        The maximum length of one batched message [characters]
     """
+    max_msg_len = 256 # conservative default for GPIB instruments
+    # header suffixes that are always sent even if the shadow says otherwise
+    shadow_exclude = ()
+    # writing a header suffix (key) makes the shadowed values of others (value) unknown
+    shadow_coupling = {}
+    # share sessions between drivers through a SessionPool if set
+    session_pool = None
+    # open addresses directly and only identify a device on first contact
+    fast_connect = False
+    # read chunk size of binary blocks [bytes], pyvisa's default if None
+    binary_chunk_size = None
+    # wait for the completion of operations via a service request instead of polling
+    srq_supported = False
+    # the longest wait for a service request before falling back to polling [s]
+    srq_timeout = 1
+
     def __init__(self, rsc_addr: str, rm: ResourceManager, **kwargs):
         # Communicate with the resource and identify it
         self._addr = rsc_addr
         self._rm = rm
         self._rm.timeout = 25e+03
+        self._pooled = None # session borrowed from the session pool
+        self._profiler = None # records the bus transactions if attached
+        self._batch = None # commands waiting to be flushed in batch mode
+        self._batch_max_len = None # message length limit of the open batch
+        self._shadow = None # last value written per header in shadow mode
+        self._shadow_stats = {"sent": 0, "skipped": 0}
+        self._query_cache = {} # results of the queries decorated by cached_query
+        self._cache_stats = {"hits": 0, "misses": 0}
+        self.max_msg_len = kwargs.get("max_msg_len", self.max_msg_len)
         # check which type of resources it is connecting to and automatically determine the read and write termination
         # character based on the resource address
         self._write_termination = kwargs.get("write_termination", "\n")
@@ -99,26 +177,75 @@ class BaseInstrument:
 
     def connect(self):
         """ Establishing a connection to the device. """
-        if self._addr in self.list_resources(): # Checking if the resource is available
-            self._instr = self._rm.open_resource(self._addr)
-            self._instr.read_termination = self._read_termination
-            self._instr.write_termination = self._write_termination
-            instr_type = self._instr.resource_info[3][:4]
-
-            known_type = ("ASRL", "GPIB", "USB", "PXI", "VXI", "TCPIP")
-
-            # make sure that we know the device type
-            if instr_type not in known_type:
-                raise Exception(f"Error code {RESOURCE_CLASS_UNKNOWN_ERR:x}: \
-                                {error_message[RESOURCE_CLASS_UNKNOWN_ERR]}")
-            self._identity = self.get_idn()
+        if self.session_pool is None:
+            self._instr = self._open()
+            self._identity = self._identify()
+            return
+
+        if self._pooled is not None: # reconnecting
+            self.session_pool.release(self._pooled)
+        self._pooled = self.session_pool.acquire(self._rm, self._addr, self._open)
+        self._instr = self._pooled.session
+        if self._pooled.identity is None:
+            self._pooled.identity = self._identify()
+        self._identity = self._pooled.identity
+
+    def _open(self):
+        """ Open a new session to the device. """
+        if self.fast_connect:
+            # skip the enumeration, a missing device fails at opening instead
+            try:
+                instr = self._rm.open_resource(self._addr)
+            except VisaIOError as exc:
+                raise Exception(f"Error code {RESOURCE_ADDR_UNKNOWN_ERR:x}: \
+                                {error_message[RESOURCE_ADDR_UNKNOWN_ERR]}") from exc
+        elif self._addr in self.list_resources(): # Checking if the resource is available
+            instr = self._rm.open_resource(self._addr)
         else:
             raise Exception(f"Error code {RESOURCE_ADDR_UNKNOWN_ERR:x}: \
                             {error_message[RESOURCE_ADDR_UNKNOWN_ERR]}")
 
+        instr.read_termination = self._read_termination
+        instr.write_termination = self._write_termination
+        instr_type = instr.resource_info[3]
+
+        known_type = ("ASRL", "GPIB", "USB", "PXI", "VXI", "TCPIP")
+
+        # make sure that we know the device type
+        if not instr_type.startswith(known_type):
+            raise Exception(f"Error code {RESOURCE_CLASS_UNKNOWN_ERR:x}: \
+                            {error_message[RESOURCE_CLASS_UNKNOWN_ERR]}")
+        return instr
+
+    def _identify(self) -> DeviceID:
+        """ Identify the device, only once per resource manager and address in fast connect mode. """
+        if not self.fast_connect:
+            return self.get_idn()
+        identities = _identity_cache.setdefault(self._rm, {})
+        if self._addr not in identities:
+            identities[self._addr] = self.get_idn()
+        return identities[self._addr]
+
+    def close(self):
+        """ Close the connection, or give the session back if it is pooled. """
+        if self._pooled is not None:
+            self.session_pool.release(self._pooled)
+            self._pooled = None
+        else:
+            self._instr.close()
+
+
+    def list_resources(self, refresh: bool=False):
+        """ List the resources, enumerated once per resource manager in fast connect mode. """
+        if not self.fast_connect or refresh or self._rm not in _resource_cache:
+            _resource_cache[self._rm] = self._rm.list_resources()
+        return _resource_cache[self._rm]
 
-    def list_resources(self):
-        return self._rm.list_resources()
+    @staticmethod
+    def clear_connect_cache():
+        """ Forget the enumerated resources and identities of the fast connect mode. """
+        _resource_cache.clear()
+        _identity_cache.clear()
 
     @staticmethod
     def value_check(value, cond: Union[Tuple, List]=None):
@@ -139,34 +266,222 @@ class BaseInstrument:
                                  \nPlease select one of the values: {[', '.join(val) for val in cond]}")
 
 
+    @contextmanager
+    def batch(self, check: bool=False, max_len: int=None):
+        """
+        Collect all writes and send them as few `;`-joined messages.
+
+        Every command is anchored to the root with a leading `:` so that
+        the SCPI header path is not inherited from the previous command.
+        A query issued inside the block flushes the pending writes first
+        to preserve the command order. Nested batches join the outer one.
+
+        e.g.
+            with instr.batch(check=True):
+                instr.set_laser_pow(10)
+                instr.set_laser_wav(1550)
+
+        Parameters
+        ----------
+        check: bool
+            If true, wait for *OPC? and check the error queue after flushing
+        max_len: int
+            The maximum length of one message. Default to max_msg_len.
+        """
+        if self._batch is not None:
+            yield self
+            return
+
+        self._batch = []
+        self._batch_max_len = max_len
+        try:
+            yield self
+        finally:
+            cmds, self._batch = self._batch, None
+            self._batch_max_len = None
+            self._send_batch(cmds, max_len=max_len)
+
+        if check:
+            self.check_errors()
+
+    @staticmethod
+    def join_cmds(cmds: Union[Tuple, List], max_len: int) -> List:
+        """ Join commands into as few messages as possible within max_len characters. """
+        msgs = []
+        msg = ""
+        for cmd in cmds:
+            cmd = cmd.strip()
+            if not cmd.startswith((":", "*")):
+                cmd = ":" + cmd
+            if msg and len(msg) + len(cmd) + 1 > max_len:
+                msgs.append(msg)
+                msg = ""
+            msg = f"{msg};{cmd}" if msg else cmd
+        if msg:
+            msgs.append(msg)
+        return msgs
+
+    def _send_batch(self, cmds: Union[Tuple, List], max_len: int=None):
+        """ Send the collected commands to the instrument. """
+        try:
+            for msg in self.join_cmds(cmds, max_len or self.max_msg_len):
+                self._io("write", self._instr.write, msg)
+        except Exception:
+            if self._shadow is not None: # the shadow was updated when the commands were queued
+                for cmd in cmds:
+                    self._shadow.pop(self.split_cmd(cmd)[0], None)
+            raise
+
+    def _flush_pending(self):
+        """ Send out queued writes so that a following read sees them. """
+        if self._batch:
+            cmds, self._batch = self._batch, []
+            self._send_batch(cmds, max_len=self._batch_max_len)
+
+    @staticmethod
+    def split_cmd(cmd: str) -> Tuple[str, str]:
+        """ Split a command into its normalised header and its parameters. """
+        header, _, value = cmd.strip().partition(" ")
+        return header.lstrip(":").lower(), value.strip()
+
+    def enable_shadow(self, state: bool=True):
+        """
+        Turn on/off the shadow mode.
+
+        In shadow mode the last value written to every header is remembered
+        and writes that would not change the instrument state are skipped.
+        """
+        self._shadow = {} if state else None
+        self._shadow_stats = {"sent": 0, "skipped": 0}
+
+    def invalidate(self):
+        """ Forget every shadowed value and cached query result. """
+        if self._shadow is not None:
+            self._shadow.clear()
+        self._query_cache.clear()
+
+    def invalidate_query(self, name: str):
+        """ Forget the cached results of one query method. """
+        for key in [key for key in self._query_cache if key[0] == name]:
+            del self._query_cache[key]
+
+    def _shadow_skip(self, header: str, value: str) -> bool:
+        """ Check whether a write can be skipped and update the shadow otherwise. """
+        if self._shadow.get(header) == value and not header.endswith(self.shadow_exclude):
+            self._shadow_stats["skipped"] += 1
+            return True
+
+        for suffix, coupled in self.shadow_coupling.items():
+            if header.endswith(suffix):
+                for key in [key for key in self._shadow if key.endswith(coupled)]:
+                    del self._shadow[key]
+        if value:
+            self._shadow[header] = value
+        self._shadow_stats["sent"] += 1
+        return False
+
+    def _io(self, kind: str, func, cmd: str, *args, **kwargs):
+        """ Run one bus transaction and record it if a profiler is attached. """
+        if self._profiler is None:
+            return func(cmd, *args, **kwargs)
+
+        start = time.perf_counter()
+        rsp = func(cmd, *args, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        nbytes = len(cmd)
+        if kind == "query":
+            nbytes += len(rsp)
+        elif kind.endswith("binary"):
+            data = rsp if kind == "query_binary" else kwargs.get("values", ())
+            nbytes += getattr(data, "nbytes", len(data)*struct.calcsize(kwargs.get("datatype", "f")))
+        self._profiler.record(self, kind, self.split_cmd(cmd)[0], nbytes, elapsed)
+        return rsp
+
+    def profile(self, maxlen: int=100000) -> CommandProfiler:
+        """
+        Profile the bus transactions of this instrument within a with block.
+
+        e.g.
+            with mm.profile() as prof:
+                mm.run_laser_sweep_auto()
+            print(prof.summary())
+        """
+        return CommandProfiler(self, maxlen=maxlen)
+
     def write(self, cmd):
         """ Write a command. """
-        self._instr.write(cmd)
+        header, value = self.split_cmd(cmd)
+        if header in ("*rst", "*rcl"):
+            self.invalidate()
+        elif self._shadow is not None and self._shadow_skip(header, value):
+            return
+
+        try:
+            if self._batch is not None:
+                self._batch.append(cmd)
+            else:
+                self._io("write", self._instr.write, cmd)
+        except Exception:
+            if self._shadow is not None: # the state of the instrument is unknown
+                self._shadow.pop(header, None)
+            raise
 
     def write_binary_values(self, cmd, **kwargs):
         """ Write a command that sets a List of binary values. """
-        self._instr.write_binary_values(cmd, **kwargs)
+        self._flush_pending()
+        self._io("write_binary", self._instr.write_binary_values, cmd, **kwargs)
 
     def query(self, cmd) -> str:
         """ Query command. """
-        return self._instr.query(cmd).rstrip()
+        self._flush_pending()
+        return self._io("query", self._instr.query, cmd).rstrip()
 
     def query_bool(self, cmd) -> bool:
         """ Convert the value return from a query to boolean. """
-        return bool(self._instr.query(cmd).rstrip())
+        return bool(self.query(cmd))
 
     def query_int(self, cmd) -> int:
         """ Convert the value return from a query to int. """
-        return int(self._instr.query(cmd).rstrip())
+        return int(self.query(cmd))
 
     def query_float(self, cmd) -> float:
         """ Convert the value return from a query to float. """
-        return float(self._instr.query(cmd).rstrip())
+        return float(self.query(cmd))
 
     def query_binary_values(self, cmd, *args, **kwargs) -> List:
         """ Convert the value return from a query to binary values. """
-        return self._instr.query_binary_values(cmd, is_big_endian=False, *args, **kwargs)
-
+        self._flush_pending()
+        kwargs.setdefault("is_big_endian", False)
+        return self._io("query_binary", self._instr.query_binary_values, cmd, *args, **kwargs)
+
+    def query_binary_array(self, cmd, datatype: str="f", is_big_endian: bool=False,
+                           chunk_size: int=None, dtype=None, **kwargs) -> np.ndarray:
+        """
+        Read a binary block straight into a numpy array.
+
+        The block is parsed without an intermediate Python list. The array
+        is copied out of the read-only receive buffer once, converted to
+        dtype on the way, so callers can modify it in place.
+
+        Parameters
+        ----------
+        datatype: str
+            The struct format of one element on the bus, i.e. "f" or "d"
+        is_big_endian: bool
+            The byte order of the block
+        chunk_size: int
+            The size of a read chunk [bytes]. Default to binary_chunk_size.
+        dtype:
+            Convert the array to this dtype if given
+        """
+        data = self.query_binary_values(
+            cmd, datatype=datatype, is_big_endian=is_big_endian, container=np.ndarray,
+            chunk_size=chunk_size or self.binary_chunk_size, **kwargs
+        )
+        return np.array(data, dtype=dtype, copy=True)
+
+    @cached_query()
     def get_idn(self) -> DeviceID:
         """ Get the identity string and parsed by DeviceID class. """
         return DeviceID(self.query("*IDN?"))
@@ -186,10 +501,112 @@ class BaseInstrument:
         """ Query of any error has occured. """
         return self.query("system:error?")
 
+    def read_stb(self) -> int:
+        """ Read the status byte with a serial poll. """
+        self._flush_pending()
+        return self._io("stb", lambda _: self._instr.read_stb(), "*STB?")
+
+    def wait_for(self, condition: Callable[[], bool], timeout: float=None,
+                 interval: float=1e-02, max_interval: float=1, delay: float=0) -> int:
+        """
+        Poll a condition with an exponential backoff until it is true.
+
+        Parameters
+        ----------
+        condition: Callable
+            Return true once the wait is over
+        timeout: float
+            The deadline [s]. Wait forever if None.
+        interval: float
+            The first polling interval [s]
+        max_interval: float
+            The longest polling interval [s]
+        delay: float
+            Time to sleep before the first poll, i.e. the expected duration [s]
+
+        Returns
+        -------
+        int
+            The number of polls
+        """
+        self._flush_pending()
+        return wait_until(condition, timeout=timeout, interval=interval,
+                          max_interval=max_interval, delay=delay)
+
+    def wait_opc(self, timeout: float=None, **kwargs):
+        """
+        Wait until all pending operations are complete.
+
+        *OPC sets the operation complete bit of the event status register,
+        which is reported in the ESB bit of the status byte. The completion
+        is signalled by a service request if the instrument and the
+        interface support it. If no service request arrives within
+        srq_timeout, i.e. because the interface never delivers it, or if
+        service requests are not supported, the status byte is serial
+        polled with a backoff. Writes pending in a batch are sent before waiting.
+
+        Parameters
+        ----------
+        timeout: float
+            The deadline [s]. Wait forever if None.
+        **kwargs:
+            The polling parameters passed on to wait_for
+        """
+        esb = 1 << 5
+        started = time.monotonic()
+        self.query("*ESR?") # clear the event status register
+        self.write("*ESE 1")
+
+        srq = self.srq_supported
+        if srq:
+            self.write("*SRE 32")
+            self._flush_pending()
+            try:
+                self._instr.enable_event(EventType.service_request, EventMechanism.queue)
+                # drop service requests left over from earlier operations
+                self._instr.discard_events(EventType.service_request, EventMechanism.queue)
+            except (AttributeError, NotImplementedError, VisaIOError):
+                srq = False # i.e. a socket connection without service requests
+
+        self.write("*OPC")
+        done = False
+        if srq:
+            wait = self.srq_timeout if timeout is None else min(timeout, self.srq_timeout)
+            try:
+                self._flush_pending() # the *OPC must be sent before waiting on it
+                rsp = self._instr.wait_on_event(EventType.service_request, int(wait*1e+03),
+                                                capture_timeout=True)
+                done = not rsp.timed_out
+            finally:
+                self._instr.disable_event(EventType.service_request, EventMechanism.queue)
+
+        if not done:
+            remaining = None if timeout is None else max(timeout - (time.monotonic() - started), 0)
+            self.wait_for(lambda: self.read_stb() & esb, timeout=remaining, **kwargs)
+        self.query("*ESR?")
+
+    def check_errors(self):
+        """ Wait for all pending operations and raise if the error queue is not empty. """
+        self.opc()
+        rsp = self.err()
+        if not rsp.lstrip("+").startswith("0"):
+            raise RuntimeError(f"Error code {HW_REPORTED_ERR:x}: \
+                               {error_message[HW_REPORTED_ERR]} {rsp}")
+
     @property
     def identity(self) -> str:
         return self._identity
 
+    @property
+    def shadow_stats(self) -> dict:
+        """ Number of writes sent to and skipped from the bus in shadow mode. """
+        return dict(self._shadow_stats)
+
+    @property
+    def cache_stats(self) -> dict:
+        """ Number of cached query hits and misses. """
+        return dict(self._cache_stats)
+
     @property
     def address(self) -> str:
         return self._addr
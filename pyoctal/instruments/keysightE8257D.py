@@ -2,7 +2,7 @@ from typing import Union
 
 from pyvisa import ResourceManager
 
-from pyoctal.instruments.base import BaseInstrument
+from pyoctal.instruments.base import BaseInstrument, cached_query
 
 class KeysightE8257D(BaseInstrument):
     """
@@ -23,11 +23,13 @@ class KeysightE8257D(BaseInstrument):
     def load_corr_file(self, fname: str):
         """ Load correction file. """
         self.write(f"correction:flatness:load {fname}")
+        self.invalidate_query("get_corr_flat_points")
 
     def set_corr_state(self, state: Union[bool, str]):
         """ Set correction system state. """
         self.write(f"correction:state {state}")
         
+    @cached_query()
     def get_corr_flat_points(self) -> float:
         """ Get correction flatness points. """
         return self.query_float("correction:flatness:points?")
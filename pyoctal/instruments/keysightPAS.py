@@ -1,14 +1,17 @@
 """ Photonics Application Suite (PAS) Interface """
 
 import math
-import time
-from typing import Tuple, List
+from typing import Tuple
 from pathlib import Path
 from os import makedirs
 
 import numpy as np
+import pythoncom
 import win32com.client
 
+from pyoctal.utils.omr import extract_graphs, get_wavelength
+from pyoctal.utils.util import wait_until
+
 class BasePAS:
     """
     A base Photonics Application Suite class.
@@ -39,15 +42,9 @@ class BasePAS:
             if config_path:
                 self.load_configuration(config_path.absolute())
             self.activate()
-            activating = 0
-            start = time.time()
 
             # Check engine activation status
-            while activating == 0:
-                time.sleep(0.5)
-                activating = self.engine_state()
-                if time.time() - start > 30:
-                    raise TimeoutError("Timeout error: check devices connection")
+            wait_until(self.engine_state, timeout=30, interval=0.1, max_interval=1)
 
 
     def activate(self):
@@ -227,38 +224,70 @@ class KeysightILME(BasePAS):
         """ Stop a measurement. """
         self.engine.StopMeasurement()
 
-    def get_result(self) -> Tuple[List, Tuple]:
+    def get_result(self) -> Tuple[np.ndarray, np.ndarray, object]:
         """ 
         Obtain result after the measurement.
-        
-        Parameter
-        ---------
-        col_name: str
-            Column name 
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray, object]
+            The wavelengths [nm], the averaged insertion loss [dB] and the OMR file
         """
-        busy = True
+        IOMRFile = self.get_omr()
+        graphs = self.extract_graphs(IOMRFile, names=("RXTXAvgIL",))
+        return graphs["wavelength"], graphs["RXTXAvgIL"], IOMRFile
 
-        # Wait for the sweep to finish
-        while busy is True:
-            time.sleep(0.1)
-            busy = self.engine.Busy
+    def get_omr(self):
+        """ Wait for the measurement to finish and get its OMR file. """
+        wait_until(lambda: not self.engine.Busy, interval=0.1, max_interval=0.5)
+        return self.engine.MeasurementResult
 
-        IOMRFile = self.engine.MeasurementResult
-        IOMRGraph = IOMRFile.Graph("RXTXAvgIL")
-        data_per_curve = IOMRGraph.dataPerCurve
+    def get_graphs(self, names: Tuple[str, ...]=("RXTXAvgIL",), omr=None) -> np.ndarray:
+        """
+        Get several graphs of a measurement, see extract_graphs.
+
+        Parameters
+        ----------
+        names: Tuple[str, ...], default: ("RXTXAvgIL",)
+            The names of the OMR graphs, i.e. "RXTXAvgIL", "RXTXPDL",
+            "RXTXMinIL" or "RXTXMaxIL"
+        omr:
+            The OMR file. Default to the result of the last measurement.
+        """
+        return self.extract_graphs(self.get_omr() if omr is None else omr, names)
 
-        # Need to check if the channel number is always 1
-        ydata = IOMRGraph.YData
-    
-        return self.get_wavelength(IOMRGraph, data_per_curve), ydata, IOMRFile
+    @staticmethod
+    def extract_graphs(omr, names: Tuple[str, ...]) -> np.ndarray:
+        """ Extract graphs of an OMR file into one structured array, see utils.omr. """
+        return extract_graphs(omr, names)
+
+    def measure(self):
+        """
+        Run one measurement and get its result marshalled, so that it can be
+        read with read_result in another thread, i.e. in a Pipeline.
+        """
+        self.start_meas()
+        wait_until(lambda: not self.engine.Busy, interval=0.1, max_interval=0.5)
+        return pythoncom.CoMarshalInterThreadInterfaceInStream(
+            pythoncom.IID_IDispatch, self.engine.MeasurementResult._oleobj_
+        )
+
+    @classmethod
+    def read_result(cls, stream) -> Tuple[np.ndarray, np.ndarray, object]:
+        """
+        Read the result of measure like get_result. The thread must have
+        initialised COM, i.e. with pythoncom.CoInitialize.
+        """
+        IOMRFile = win32com.client.Dispatch(
+            pythoncom.CoGetInterfaceAndReleaseStream(stream, pythoncom.IID_IDispatch)
+        )
+        graphs = cls.extract_graphs(IOMRFile, names=("RXTXAvgIL",))
+        return graphs["wavelength"], graphs["RXTXAvgIL"], IOMRFile
 
     @staticmethod
-    def get_wavelength(IOMRGraph, data_per_curve) -> Tuple:
-        """ Get all wavelength datapoints from a measurement. """
-        xstart = IOMRGraph.xStart
-        xstep = IOMRGraph.xStep
-        xdata = [xstart + i * xstep for i in range(data_per_curve)]
-        return Tuple(np.divide(xdata, 1e-9))
+    def get_wavelength(IOMRGraph, data_per_curve) -> np.ndarray:
+        """ Get all wavelength datapoints [nm] from a measurement. """
+        return get_wavelength(IOMRGraph, data_per_curve)
 
 
 def export_to_omr(data, filename: Path):
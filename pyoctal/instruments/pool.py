@@ -0,0 +1,131 @@
+"""
+Process-wide pool of VISA sessions.
+
+Driver objects pointing at the same resource address share a single VISA
+session instead of opening a new one (and re-identifying the instrument)
+every time they are constructed. Sessions are reference counted and are
+only closed once they have been unused for longer than the idle timeout.
+
+e.g.
+    BaseInstrument.session_pool = SessionPool(idle_timeout=60)
+    scope = Keysight86100D(addr="GPIB0::7::INSTR", rm=rm)
+    dca = KeysightFlexDCA(addr="GPIB0::7::INSTR", rm=rm) # same session
+"""
+from typing import Callable
+import atexit
+import logging
+import threading
+import time
+
+from pyvisa import ResourceManager
+
+logger = logging.getLogger(__name__)
+
+
+class PooledSession:
+    """
+    A VISA session shared by all the drivers of one resource.
+
+    Parameters
+    ----------
+    session:
+        The opened pyvisa resource
+    rm:
+        Pyvisa resource manager that opened the session
+    """
+    def __init__(self, session, rm: ResourceManager):
+        self.session = session
+        self.rm = rm
+        self.identity = None # identity of the device, queried on first contact
+        self.refs = 0
+        self.released = time.monotonic()
+
+    def __repr__(self) -> str:
+        return f"PooledSession({self.session}, refs={self.refs})"
+
+
+class SessionPool:
+    """
+    Reference-counted VISA session pool keyed by resource address.
+
+    Idle sessions are closed lazily on the next pool access after the
+    timeout has expired, by close_idle(), or when the process exits.
+
+    Parameters
+    ----------
+    idle_timeout: float, default: 60
+        Time an unused session is kept open for [s]
+    """
+    def __init__(self, idle_timeout: float=60):
+        self.idle_timeout = idle_timeout
+        self._entries = {}
+        self._lock = threading.Lock()
+        atexit.register(self.close_all)
+
+    @staticmethod
+    def _key(rm: ResourceManager, addr: str):
+        # the entry holds a reference to rm so the id cannot be reused
+        return (id(rm), addr)
+
+    def acquire(self, rm: ResourceManager, addr: str, opener: Callable) -> PooledSession:
+        """
+        Get the shared session of an address, opening it if necessary.
+
+        Parameters
+        ----------
+        rm: ResourceManager
+            Pyvisa resource manager
+        addr: str
+            The address of the instrument
+        opener: Callable
+            Open a new session when there is none in the pool
+        """
+        with self._lock:
+            self._close_idle()
+            key = self._key(rm, addr)
+            if key not in self._entries:
+                self._entries[key] = PooledSession(opener(), rm)
+                logger.debug(f"Opened a pooled session to {addr}")
+            entry = self._entries[key]
+            entry.refs += 1
+            return entry
+
+    def release(self, entry: PooledSession):
+        """ Give a session back to the pool. """
+        with self._lock:
+            entry.refs = max(entry.refs - 1, 0)
+            entry.released = time.monotonic()
+            self._close_idle()
+
+    def close_idle(self):
+        """ Close every session that has been unused for longer than the idle timeout. """
+        with self._lock:
+            self._close_idle()
+
+    def _close_idle(self):
+        now = time.monotonic()
+        for key, entry in list(self._entries.items()):
+            if entry.refs == 0 and now - entry.released >= self.idle_timeout:
+                self._close(key)
+
+    def close_all(self):
+        """ Close every session regardless of whether it is still in use. """
+        with self._lock:
+            for key in list(self._entries):
+                self._close(key)
+
+    def _close(self, key):
+        entry = self._entries.pop(key)
+        try:
+            entry.session.close()
+        except Exception as exc: # the resource manager might be closed already
+            logger.debug(f"Failed to close {entry.session}: {exc}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, addr: str) -> bool:
+        return any(key[1] == addr for key in self._entries)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(idle_timeout={self.idle_timeout})"
@@ -0,0 +1,136 @@
+"""
+Bus transaction profiler.
+
+Every write, query and binary transfer of the attached instruments is
+recorded with its SCPI header, the number of bytes moved and the wall time
+into a fixed-size ring buffer, so that the slow commands of a sweep can be
+found afterwards.
+
+e.g.
+    with CommandProfiler(mm, pm) as prof:
+        run_one_source(...)
+    print(prof.summary())
+    prof.to_csv("profile.csv")
+"""
+from collections import deque, namedtuple
+from typing import Dict, Tuple
+import csv
+import json
+import time
+
+import numpy as np
+
+Record = namedtuple("Record", ["stamp", "instr", "kind", "header", "nbytes", "elapsed"])
+
+
+class CommandProfiler:
+    """
+    Record the bus transactions of instruments.
+
+    Parameters
+    ----------
+    *instrs: BaseInstrument
+        Instruments to profile while the profiler is used as a context manager
+    maxlen: int, default: 100000
+        The number of records kept, older records are discarded first
+    """
+    fields = Record._fields
+
+    def __init__(self, *instrs, maxlen: int=100000):
+        self._instrs = instrs
+        self._records = deque(maxlen=maxlen)
+
+    def attach(self, *instrs):
+        """ Start recording the transactions of instruments. """
+        for instr in instrs:
+            instr._profiler = self
+
+    def detach(self, *instrs):
+        """ Stop recording the transactions of instruments. """
+        for instr in instrs:
+            if instr._profiler is self:
+                instr._profiler = None
+
+    def record(self, instr, kind: str, header: str, nbytes: int, elapsed: float):
+        """ Add one transaction to the ring buffer. """
+        self._records.append(
+            (time.time(), f"{instr.__class__.__name__}@{instr.address}",
+             kind, header, nbytes, elapsed)
+        )
+
+    def clear(self):
+        """ Remove all the records. """
+        self._records.clear()
+
+    @property
+    def records(self) -> list:
+        return [Record(*record) for record in self._records]
+
+    def histograms(self, percentiles: Tuple=(50, 95, 99)) -> Dict:
+        """
+        Get the latency statistics of every command.
+
+        Returns
+        -------
+        Dict
+            {(instrument, header): {"count", "bytes", "total", "p50", ...}}
+            with times in seconds
+        """
+        groups = {}
+        for _, instr, _, header, nbytes, elapsed in self._records:
+            group = groups.setdefault((instr, header), ([], []))
+            group[0].append(elapsed)
+            group[1].append(nbytes)
+
+        stats = {}
+        for key, (elapsed, nbytes) in groups.items():
+            elapsed = np.asarray(elapsed)
+            stats[key] = {
+                "count": len(elapsed),
+                "bytes": int(np.sum(nbytes)),
+                "total": float(elapsed.sum()),
+                **{f"p{p}": val for p, val in
+                   zip(percentiles, np.percentile(elapsed, percentiles).tolist())},
+            }
+        return stats
+
+    def summary(self, top: int=20) -> str:
+        """ Get a table of the commands that took the longest in total. """
+        stats = sorted(self.histograms().items(), key=lambda item: -item[1]["total"])
+        lines = [f"| {'Instrument':<30} | {'Header':<40} | {'Count':>6} | {'Total [s]':>9} "
+                 f"| {'p50 [ms]':>8} | {'p95 [ms]':>8} | {'p99 [ms]':>8} |"]
+        for (instr, header), stat in stats[:top]:
+            lines.append(
+                f"| {instr:<30} | {header:<40} | {stat['count']:>6} | {stat['total']:>9.3f} "
+                f"| {stat['p50']*1e3:>8.2f} | {stat['p95']*1e3:>8.2f} | {stat['p99']*1e3:>8.2f} |"
+            )
+        return "\n".join(lines)
+
+    def to_csv(self, filename: str):
+        """ Export all the records to a CSV file. """
+        with open(filename, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(self.fields)
+            writer.writerows(self._records)
+
+    def to_json(self, filename: str):
+        """ Export all the records and the per-command statistics to a JSON file. """
+        data = {
+            "records": [dict(zip(self.fields, record)) for record in self._records],
+            "histograms": [
+                {"instr": instr, "header": header, **stat}
+                for (instr, header), stat in self.histograms().items()
+            ],
+        }
+        with open(filename, "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=4)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __enter__(self):
+        self.attach(*self._instrs)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.detach(*self._instrs)
@@ -0,0 +1,300 @@
+"""
+Record-and-replay transport.
+
+A RecordingResourceManager wraps a real resource manager and captures every
+transaction (command, response, timing) of the drivers constructed with it.
+The capture can be saved as a native replay file or as a pyvisa-sim YAML
+profile. A ReplayResourceManager then serves the recorded responses, so
+production sweeps can be profiled and regression tested without instruments.
+
+e.g.
+    rm = RecordingResourceManager(ResourceManager())
+    mm = Agilent8164B(addr="GPIB0::20::INSTR", rm=rm)
+    mm.run_laser_sweep_auto()
+    rm.save("sweep.json")
+    rm.save_sim_yaml("sweep.yaml")
+
+    rm = ReplayResourceManager("sweep.json", timing=True)
+    mm = Agilent8164B(addr="GPIB0::20::INSTR", rm=rm)
+"""
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, List
+import json
+import logging
+import time
+
+import numpy as np
+import yaml
+from pyvisa import ResourceManager
+from pyvisa.constants import StatusCode
+from pyvisa.errors import VisaIOError
+
+logger = logging.getLogger(__name__)
+
+ResourceInfo = namedtuple(
+    "ResourceInfo",
+    ["interface_type", "interface_board_number", "resource_class", "resource_name", "alias"]
+)
+
+# the response to wait_on_event
+WaitResponse = namedtuple("WaitResponse", ["event_type", "timed_out"])
+
+
+def _to_list(values) -> List:
+    """ Convert a binary block to a JSON compatible list. """
+    return values.tolist() if hasattr(values, "tolist") else list(values)
+
+
+class RecordingSession:
+    """
+    A pyvisa resource that logs all of its transactions.
+
+    Parameters
+    ----------
+    session:
+        The pyvisa resource to record
+    log: List
+        The list that the transactions are appended to
+    """
+    def __init__(self, session, log: List):
+        object.__setattr__(self, "_session", session)
+        object.__setattr__(self, "_log", log)
+
+    def _record(self, op: str, cmd: str, func, *args, **kwargs):
+        start = time.perf_counter()
+        rsp = func(cmd, *args, **kwargs)
+        event = {"op": op, "cmd": cmd, "elapsed": time.perf_counter() - start}
+        if op == "query":
+            event["rsp"] = rsp
+        elif op == "query_binary":
+            event["rsp"] = _to_list(rsp)
+        elif op == "stb":
+            event["rsp"] = int(rsp)
+        elif op == "event":
+            event["rsp"] = bool(rsp.timed_out)
+        self._log.append(event)
+        return rsp
+
+    def write(self, cmd: str, *args, **kwargs):
+        return self._record("write", cmd, self._session.write, *args, **kwargs)
+
+    def write_binary_values(self, cmd: str, *args, **kwargs):
+        return self._record("write_binary", cmd, self._session.write_binary_values,
+                            *args, **kwargs)
+
+    def query(self, cmd: str, *args, **kwargs) -> str:
+        return self._record("query", cmd, self._session.query, *args, **kwargs)
+
+    def query_binary_values(self, cmd: str, *args, **kwargs):
+        return self._record("query_binary", cmd, self._session.query_binary_values,
+                            *args, **kwargs)
+
+    def read_stb(self) -> int:
+        return self._record("stb", "*STB?", lambda _: self._session.read_stb())
+
+    def wait_on_event(self, event_type, timeout: int, *args, **kwargs):
+        return self._record("event", str(int(event_type)),
+                            lambda _: self._session.wait_on_event(event_type, timeout,
+                                                                  *args, **kwargs))
+
+    def __getattr__(self, name: str):
+        return getattr(self._session, name)
+
+    def __setattr__(self, name: str, value):
+        setattr(self._session, name, value)
+
+
+class RecordingResourceManager:
+    """
+    Resource manager that records the sessions it opens.
+
+    Parameters
+    ----------
+    rm: ResourceManager
+        Pyvisa resource manager of the real instruments
+    """
+    def __init__(self, rm: ResourceManager):
+        self._rm = rm
+        self._logs = {}
+        self.timeout = None
+
+    @property
+    def logs(self) -> Dict:
+        """ The recorded transactions per resource address. """
+        return self._logs
+
+    def list_resources(self, *args, **kwargs):
+        return self._rm.list_resources(*args, **kwargs)
+
+    def open_resource(self, addr: str, **kwargs) -> RecordingSession:
+        session = self._rm.open_resource(addr, **kwargs)
+        return RecordingSession(session, self._logs.setdefault(addr, []))
+
+    def attach(self, instr):
+        """ Record an instrument that has already been connected. """
+        instr._instr = RecordingSession(instr.instr, self._logs.setdefault(instr.address, []))
+
+    def close(self):
+        self._rm.close()
+
+    def save(self, filename: Path):
+        """ Save the recorded transactions to a native replay file. """
+        with open(filename, "w", encoding="utf-8") as file:
+            json.dump({"resources": self._logs}, file, indent=1)
+
+    def save_sim_yaml(self, filename: Path):
+        """
+        Save the recorded transactions as a pyvisa-sim profile.
+
+        pyvisa-sim answers a query with a fixed string, so the last response
+        of every query is used. Binary transfers, status byte reads and events
+        cannot be expressed and are skipped.
+        """
+        devices = {}
+        resources = {}
+        for i, (addr, log) in enumerate(self._logs.items()):
+            dialogues = {}
+            for event in log:
+                if event["op"] == "query":
+                    dialogues[event["cmd"]] = event["rsp"]
+                elif event["op"] == "write":
+                    dialogues.setdefault(event["cmd"], None)
+                else:
+                    logger.warning(f"Skipped {event['op']} transaction '{event['cmd']}' of {addr}")
+
+            intf = addr.split("::")[0].rstrip("0123456789")
+            eom = {"q": "\n", "r": "\r\n" if intf == "ASRL" else "\n"}
+            name = f"device {i + 1}"
+            devices[name] = {
+                "eom": {f"{intf} {addr.split('::')[-1]}": eom},
+                "error": "ERROR",
+                "dialogues": [
+                    {"q": cmd} if rsp is None else {"q": cmd, "r": rsp}
+                    for cmd, rsp in dialogues.items()
+                ],
+            }
+            resources[addr] = {"device": name}
+
+        with open(filename, "w", encoding="utf-8") as file:
+            yaml.safe_dump({"spec": "1.0", "devices": devices, "resources": resources},
+                           file, sort_keys=False)
+
+
+class ReplaySession:
+    """
+    A pyvisa resource that serves recorded responses.
+
+    Transactions are matched in the recorded order. When the driver diverges
+    from the recording, the latest response recorded for the same command is
+    served instead, unless strict is set.
+
+    Parameters
+    ----------
+    addr: str
+        The address of the recorded instrument
+    log: List
+        The recorded transactions
+    timing: bool
+        If true, take as long as the original transactions did
+    strict: bool
+        If true, raise when a transaction does not match the recording
+    """
+    def __init__(self, addr: str, log: List, timing: bool=False, strict: bool=False):
+        self._log = log
+        self._pos = 0
+        self._timing = timing
+        self._strict = strict
+        self.read_termination = "\n"
+        self.write_termination = "\n"
+        self.resource_info = ResourceInfo(None, None, addr.split("::")[-1], addr, None)
+
+    def _next(self, op: str, cmd: str) -> Dict:
+        """ Find the event matching a transaction. """
+        for pos in range(self._pos, len(self._log)):
+            event = self._log[pos]
+            if event["op"] == op and event["cmd"] == cmd:
+                self._pos = pos + 1
+                break
+            if self._strict:
+                raise ValueError(f"Replay diverged: expected {event['op']} '{event['cmd']}', "
+                                 f"got {op} '{cmd}'.")
+        else:
+            matches = [event for event in self._log if event["op"] == op and event["cmd"] == cmd]
+            if self._strict or not matches:
+                raise ValueError(f"No recorded response to {op} '{cmd}'.")
+            event = matches[-1]
+
+        if self._timing:
+            time.sleep(event["elapsed"])
+        return event
+
+    def write(self, cmd: str, *args, **kwargs):
+        self._next("write", cmd)
+        return len(cmd)
+
+    def write_binary_values(self, cmd: str, *args, **kwargs):
+        self._next("write_binary", cmd)
+
+    def query(self, cmd: str, *args, **kwargs) -> str:
+        return self._next("query", cmd)["rsp"]
+
+    def query_binary_values(self, cmd: str, datatype: str="f", is_big_endian: bool=False,
+                            container=list, **kwargs):
+        values = self._next("query_binary", cmd)["rsp"]
+        if container is np.ndarray:
+            return np.asarray(values, dtype=(">" if is_big_endian else "<") + datatype)
+        return container(values)
+
+    def read_stb(self) -> int:
+        return self._next("stb", "*STB?")["rsp"]
+
+    def enable_event(self, event_type, mechanism, *args, **kwargs):
+        pass
+
+    def disable_event(self, event_type, mechanism, *args, **kwargs):
+        pass
+
+    def discard_events(self, event_type, mechanism, *args, **kwargs):
+        pass
+
+    def wait_on_event(self, event_type, timeout: int, capture_timeout: bool=False) -> WaitResponse:
+        timed_out = self._next("event", str(int(event_type)))["rsp"]
+        if timed_out and not capture_timeout:
+            raise VisaIOError(StatusCode.error_timeout)
+        return WaitResponse(event_type, timed_out)
+
+    def close(self):
+        self._pos = 0
+
+
+class ReplayResourceManager:
+    """
+    Resource manager that replays recorded sessions.
+
+    Parameters
+    ----------
+    filename: Path
+        The native replay file saved by RecordingResourceManager
+    timing: bool, default: False
+        If true, reproduce the original timing of every transaction
+    strict: bool, default: False
+        If true, raise when a driver diverges from the recording
+    """
+    def __init__(self, filename: Path, timing: bool=False, strict: bool=False):
+        with open(filename, "r", encoding="utf-8") as file:
+            self._logs = json.load(file)["resources"]
+        self.timing = timing
+        self.strict = strict
+        self.timeout = None
+
+    def list_resources(self, *args, **kwargs):
+        return tuple(self._logs)
+
+    def open_resource(self, addr: str, **kwargs) -> ReplaySession:
+        if addr not in self._logs:
+            raise ValueError(f"{addr} has not been recorded.")
+        return ReplaySession(addr, self._logs[addr], timing=self.timing, strict=self.strict)
+
+    def close(self):
+        pass
@@ -1,7 +1,6 @@
 from typing import Tuple
 
 import numpy as np
-import matplotlib.pyplot as plot
 from pyvisa import ResourceManager
 
 from pyoctal.instruments.base import BaseInstrument
@@ -107,18 +106,16 @@ class TektronixScope(BaseInstrument):
         """ Get the curve data. """
         return self.query("curve?")
 
+    def get_curve_binary(self, width: int=2) -> np.ndarray:
+        """ Get the curve data as a signed big-endian binary block of 1 or 2-byte points. """
+        self.set_data_format("rib")
+        self.write(f"data:width {width}")
+        return self.query_binary_array("curve?", datatype={1: "b", 2: "h"}[width],
+                                       is_big_endian=True)
+
     def read_data(self) -> np.array:
         """ Function for reading data and parsing binary into np array """
-        data = self.get_curve()
-        datasplit = data.split(',')
-        dataint = list(map(int,datasplit))
-
-        # First few bytes are characters to specify
-        # the length of the transmission. Need to strip these off:
-        # we'll assume a 5000-byte transmission
-        # so the string would be "#45000" and we therefor strip 6 bytes.
-        # return np.frombuffer(rawdata[6:-1], 'i2')
-        return np.array(dataint)
+        return self.get_curve_binary()
 
 
     def get_data(self,source: str):
@@ -156,6 +153,8 @@ class TektronixScope(BaseInstrument):
 
     def plot_wfm(self, source: str):
         " Plot the oscilloscope waveform "
+        import matplotlib.pyplot as plot # slow to import, only load when needed
+
         xdata = self.get_xdata()
         ydata = self.get_data(source)
         xunit, yunit = self.get_wfmp_units()
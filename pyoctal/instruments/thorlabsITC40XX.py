@@ -1,6 +1,6 @@
 from pyvisa import ResourceManager
 
-from pyoctal.instruments.base import BaseInstrument
+from pyoctal.instruments.base import BaseInstrument, cached_query
 from pyoctal.utils.error import PARAM_OUT_OF_RANGE_ERR, error_message
 
 class ThorlabsITC4002QCL(BaseInstrument):
@@ -22,10 +22,16 @@ class ThorlabsITC4002QCL(BaseInstrument):
         """ Get current value [A]. """
         return self.query_float("source:current?")
 
+    @cached_query(ttl=60) # expires in case the limit is changed on the front panel
     def get_curr_max(self) -> float:
         """ Get maximum current value [A]. """
         return self.query_float("source:current? max")
 
+    def set_curr_limit(self, curr: float):
+        """ Set the current limit [A], which bounds the maximum current value. """
+        self.write(f"source:current:limit {curr}")
+        self.invalidate_query("get_curr_max")
+
     def set_curr(self, curr: float):
         """ Set current value [A]. """
         if curr > self.get_curr_max():
@@ -64,8 +64,8 @@ class TTiTGF3162(BaseInstrument):
         
         The array of values should be between -1 and 1 and the max length is 1024.
         """
-        values = np.int16(array*pow(2, 15))
-        self.write_binary_values(f"arb{memchan}, {values}", is_big_endian=True, datatype='h')
+        values = np.int16(np.asarray(array)*pow(2, 15))
+        self.write_binary_values(f"arb{memchan}, ", values=values, is_big_endian=True, datatype='h')
 
     def set_arb_output(self):
         """ Set the waveform output to arbitrary. """
@@ -76,6 +76,7 @@ class TTiTGF3162(BaseInstrument):
         y = 0.999*np.ones(2)
         self.set_arb_waveform(y, memchan)
 
-    def get_arb_waveform(self, memchan: int) -> Union[List,Tuple]:
-        """ Get the arbitrary waveform. """
-        return self.query_binary_values(f"arb{memchan}?")
+    def get_arb_waveform(self, memchan: int) -> np.ndarray:
+        """ Get the arbitrary waveform scaled between -1 and 1. """
+        values = self.query_binary_array(f"arb{memchan}?", datatype='h', is_big_endian=True)
+        return values/pow(2, 15)
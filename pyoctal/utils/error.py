@@ -5,6 +5,7 @@ PYTHON_VER_ERROR = 101
 RESOURCE_ADDR_UNKNOWN_ERR = 102
 RESOURCE_CLASS_UNKNOWN_ERR = 103
 HW_TIMEOUT_ERR = 105
+HW_REPORTED_ERR = 106
 
 PARAM_OUT_OF_RANGE_ERR = 200
 PARAM_INVALID_ERR = 201
@@ -23,6 +24,7 @@ error_message = {
     RESOURCE_ADDR_UNKNOWN_ERR: "Resource not found. Check your address on NI MAX or Connection Expert",
     RESOURCE_CLASS_UNKNOWN_ERR: "'Resource class not contemplated. Please add this class to the system.",
     HW_TIMEOUT_ERR: "Time out while waiting for hardware unit to respond.",
+    HW_REPORTED_ERR: "Instrument reported an error in its error queue.",
 
     PARAM_OUT_OF_RANGE_ERR: "Parameter is out of range.",
     PARAM_INVALID_ERR: "Parameter is invalid.",
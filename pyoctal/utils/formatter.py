@@ -1,7 +1,6 @@
 import logging
 import argparse
 import sys
-import matplotlib as mpl
 
 class Colours:
     cyan = "\x1b[34m"
@@ -81,6 +80,8 @@ class Publication:
         """
         Set the basic settings for the publication quality figures.
         """
+        import matplotlib as mpl # slow to import, only load when needed
+
         medium_font = 8
         large_font = 10
 
@@ -0,0 +1,51 @@
+"""
+Extraction of the graphs of OMR files of the Photonics Application Suite.
+
+The OMR objects come from the PAS engines over COM, but only their graph
+attributes are used here, so the extraction does not need COM.
+"""
+from typing import Tuple
+
+import numpy as np
+
+
+def get_wavelength(graph, data_per_curve: int) -> np.ndarray:
+    """ Get all wavelength datapoints [nm] of an OMR graph. """
+    return (graph.xStart + np.arange(data_per_curve)*graph.xStep)/1e-09
+
+
+def extract_graphs(omr, names: Tuple[str, ...]) -> np.ndarray:
+    """
+    Extract graphs of an OMR file into one structured array.
+
+    The graphs must share the wavelength axis. The data of every graph
+    is converted from COM in one go. A graph with several curves, i.e.
+    one per channel, gets one column per curve.
+
+    Returns
+    -------
+    np.ndarray
+        One record per wavelength with the field "wavelength" [nm] and
+        one field per graph
+    """
+    axis = None
+    wavelengths = None
+    columns = []
+    for name in names:
+        graph = omr.Graph(name)
+        points = graph.dataPerCurve
+        if axis is None:
+            axis = (graph.xStart, graph.xStep, points)
+            wavelengths = get_wavelength(graph, points)
+        elif axis != (graph.xStart, graph.xStep, points):
+            raise ValueError(f"The graph {name} does not share the wavelength axis.")
+        ydata = np.asarray(graph.YData, dtype=float).reshape(-1, points).T
+        columns.append(ydata[:, 0] if ydata.shape[1] == 1 else ydata)
+
+    graphs = np.empty(axis[2], dtype=[("wavelength", float)] + [
+        (name, float, column.shape[1:]) for name, column in zip(names, columns)
+    ])
+    graphs["wavelength"] = wavelengths
+    for name, column in zip(names, columns):
+        graphs[name] = column
+    return graphs
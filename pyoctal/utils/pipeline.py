@@ -0,0 +1,125 @@
+"""
+Overlap the processing of measured points with the measurement of the next.
+
+The measurement of every point runs in the calling thread, while the
+extraction and the export of its result run in a worker thread. A bounded
+queue between them stops the measurement from running ahead of the export
+by more than a few points.
+
+e.g.
+    def measure(volt):
+        pm.set_volt(volt)
+        return ilme.measure()
+
+    def export(volt, handle):
+        wavelengths, loss, omr = ilme.read_result(handle)
+        export_to_omr(omr, folder / f"{volt}V.omr")
+
+    run_pipelined(voltages, measure, export, initializer=pythoncom.CoInitialize)
+"""
+from typing import Callable, Iterable, List
+import queue
+import threading
+
+
+class Pipeline:
+    """
+    Process submitted items in order in a worker thread.
+
+    An error in the worker stops the processing and is raised again in the
+    calling thread on the next submit or on close.
+
+    Parameters
+    ----------
+    process: Callable
+        Called in the worker with the arguments of every submit
+    maxsize: int, default: 2
+        The number of items waiting to be processed before submit blocks
+    initializer: Callable
+        Called once in the worker before any item, i.e. to initialise COM
+    """
+    _done = object()
+
+    def __init__(self, process: Callable, maxsize: int=2, initializer: Callable=None):
+        self.process = process
+        self.initializer = initializer
+        self.results = []
+        self._error = None
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._work, name="pipeline", daemon=True)
+        self._thread.start()
+
+    def _work(self):
+        try:
+            if self.initializer is not None:
+                self.initializer()
+        except Exception as exc:
+            self._error = exc
+        while True:
+            item = self._queue.get()
+            if item is self._done:
+                return
+            if self._error is not None: # keep draining so that submit never blocks
+                continue
+            try:
+                self.results.append(self.process(*item))
+            except Exception as exc:
+                self._error = exc
+
+    def _raise(self):
+        if self._error is not None:
+            raise RuntimeError("Processing in the pipeline failed.") from self._error
+
+    def submit(self, *args):
+        """ Queue an item, blocking while the worker is maxsize items behind. """
+        self._raise()
+        self._queue.put(args)
+
+    def close(self) -> List:
+        """ Wait until every item is processed and get the results in order. """
+        if self._thread.is_alive():
+            self._queue.put(self._done)
+            self._thread.join()
+        self._raise()
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else: # do not hide the original error
+            self._queue.put(self._done)
+            self._thread.join()
+
+
+def run_pipelined(points: Iterable, measure: Callable, process: Callable,
+                  maxsize: int=2, initializer: Callable=None) -> List:
+    """
+    Measure every point and process the measurement while the next point
+    is measured.
+
+    Parameters
+    ----------
+    points: Iterable
+        The points to measure, i.e. the bias voltages
+    measure: Callable
+        measure(point) runs in the calling thread and returns the raw measurement
+    process: Callable
+        process(point, measurement) runs in a worker thread
+    maxsize: int, default: 2
+        The number of measurements waiting to be processed before the next
+        point waits
+    initializer: Callable
+        Called once in the worker thread before any processing
+
+    Returns
+    -------
+    List
+        The results of process for every point in order
+    """
+    with Pipeline(process, maxsize=maxsize, initializer=initializer) as pipeline:
+        for point in points:
+            pipeline.submit(point, measure(point))
+    return pipeline.results
@@ -0,0 +1,149 @@
+"""
+Reference spectra stored on disk for the normalisation of sweeps.
+
+A reference sweep, i.e. of a through waveguide, is stored under the
+configuration it was measured with. Later sweeps with the same
+configuration are normalised against it to get the insertion loss.
+
+e.g.
+    cache = ReferenceCache("references", max_age=8*3600)
+    key = cache.key_for(session)
+    cache.get_or_measure(key, session.run)
+    loss = cache.insertion_loss(key, *session.run())
+"""
+from pathlib import Path
+from typing import Callable, Tuple
+import hashlib
+import json
+import time
+
+import numpy as np
+
+
+def interp_columns(x: np.ndarray, xp: np.ndarray, fp: np.ndarray) -> np.ndarray:
+    """
+    Linearly interpolate every column of fp, sampled at the ascending xp, at x.
+    Values outside of xp are held at the end values like np.interp.
+    """
+    x = np.clip(np.asarray(x, dtype=float), xp[0], xp[-1])
+    idx = np.clip(np.searchsorted(xp, x, side="right") - 1, 0, len(xp) - 2)
+    frac = (x - xp[idx])/(xp[idx + 1] - xp[idx])
+    fp = np.asarray(fp)
+    if fp.ndim > 1:
+        frac = frac.reshape(-1, *([1]*(fp.ndim - 1)))
+    return fp[idx]*(1 - frac) + fp[idx + 1]*frac
+
+
+class ReferenceCache:
+    """
+    Cache of reference sweeps on disk.
+
+    Parameters
+    ----------
+    folder: Path, default: "references"
+        The folder the references are stored in
+    max_age: float, default: 86400
+        References older than this are not used [s]
+    """
+    def __init__(self, folder: Path="references", max_age: float=24*3600):
+        self.folder = Path(folder)
+        self.max_age = max_age
+
+    @staticmethod
+    def key(laser: str, slot: str, start: float, stop: float, step: float,
+            power: float, speed: float) -> Tuple:
+        """
+        Get the key of a sweep configuration.
+
+        Parameters
+        ----------
+        laser: str
+            The laser, i.e. its serial number and channel
+        slot: str
+            The detector slot and channel
+        start: float
+            The start wavelength [nm]
+        stop: float
+            The stop wavelength [nm]
+        step: float
+            The step wavelength [pm]
+        power: float
+            The laser power [dBm]
+        speed: float
+            The speed of sweep [nm/s]
+        """
+        return (str(laser), str(slot), float(start), float(stop), float(step),
+                None if power is None else float(power), float(speed))
+
+    def key_for(self, session) -> Tuple:
+        """ Get the key of the configuration of a LaserSweepSession. """
+        mm = session.mm
+        params = session.params
+        slot = mm.detect if session.sensors is None else \
+            ",".join(f"sense{num}:channel{chan}" for num, chan in session.sensors)
+        return self.key(f"{mm.identity.serialno}:{mm.laser}", slot, params["start"],
+                        params["stop"], params["step"], params["power"], params["speed"])
+
+    def path(self, key: Tuple) -> Path:
+        """ The file a reference is stored in. """
+        digest = hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()[:16]
+        return self.folder / f"{digest}.npz"
+
+    def store(self, key: Tuple, wavelengths: np.ndarray, powers: np.ndarray) -> Path:
+        """ Store a reference sweep. """
+        self.folder.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        np.savez(path, wavelengths=wavelengths, powers=powers,
+                 key=json.dumps(key), stamp=time.time())
+        return path
+
+    def load(self, key: Tuple) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Load a reference sweep.
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            The wavelengths and powers of the reference, or None if there is
+            no reference or it has expired
+        """
+        path = self.path(key)
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            if time.time() - float(data["stamp"]) > self.max_age:
+                return None
+            return data["wavelengths"], data["powers"]
+
+    def __contains__(self, key: Tuple) -> bool:
+        return self.load(key) is not None
+
+    def get_or_measure(self, key: Tuple, measure: Callable[[], Tuple]) -> Tuple:
+        """ Load a reference, measuring and storing it first if there is no fresh one. """
+        reference = self.load(key)
+        if reference is None:
+            reference = measure()
+            self.store(key, *reference)
+        return reference
+
+    def reference(self, key: Tuple, wavelengths: np.ndarray) -> np.ndarray:
+        """ Get the reference powers interpolated at some wavelengths. """
+        reference = self.load(key)
+        if reference is None:
+            raise KeyError(f"No fresh reference for {key}.")
+        return interp_columns(wavelengths, *reference)
+
+    def insertion_loss(self, key: Tuple, wavelengths: np.ndarray,
+                       powers: np.ndarray) -> np.ndarray:
+        """ Get the insertion loss [dB] of a sweep in linear powers against the reference. """
+        return 10*np.log10(self.reference(key, wavelengths)/powers)
+
+    def clear(self, expired: bool=True):
+        """ Delete the expired references, or all of them. """
+        now = time.time()
+        for path in self.folder.glob("*.npz"):
+            if expired:
+                with np.load(path) as data:
+                    if now - float(data["stamp"]) <= self.max_age:
+                        continue
+            path.unlink()
@@ -0,0 +1,190 @@
+"""
+Analysis of the resonances in a swept spectrum.
+"""
+from collections import namedtuple
+from typing import List, Tuple
+
+import numpy as np
+
+# the result of a resonance search, wavelengths in nm
+ResonanceSearch = namedtuple(
+    "ResonanceSearch", ["wavelength", "power", "uncertainty", "elapsed", "sweeps"]
+)
+
+# a fitted resonance dip, in the units of the wavelengths and the powers fitted
+DIP_DTYPE = np.dtype([
+    ("spectrum", int),        # index of the spectrum in the batch
+    ("index", int),           # index of the lowest sample
+    ("wavelength", float),    # centre wavelength
+    ("fwhm", float),          # full width at half maximum
+    ("q", float),             # loaded quality factor
+    ("extinction", float),    # extinction ratio [dB]
+    ("baseline", float),      # power off resonance
+    ("op_wavelength", float), # -N dB point on the blue side, nan if the dip is shallower
+])
+
+
+def resonances(data: np.array, cutoff: float, distance: int) -> List:
+    """ 
+    Find the resonances in the spectrum. 
+    
+    Parameters
+    ----------
+    cutoff: float
+        The cutoff value to find the resonances
+    distance: int
+        The minimum distance between each peak
+
+    Returns
+    -------
+    List
+        The resonances found in the spectrum
+    """
+    from scipy.signal import find_peaks # slow to import, only load when needed
+
+    peaks, _ = find_peaks(data, distance=distance)
+    peaks = peaks[data[peaks] - min(data) > cutoff]
+    return peaks
+
+
+def fit_minimum(x: np.ndarray, y: np.ndarray, window: int=7) -> Tuple[float, float, float]:
+    """
+    Locate the minimum of a sampled curve with sub-sample accuracy by
+    fitting a parabola to the samples around the lowest one.
+
+    The uncertainty combines the standard error of the fitted vertex with
+    its disagreement from the three-point vertex, which grows when the
+    window is too wide for the dip to look parabolic.
+
+    Parameters
+    ----------
+    x: np.ndarray
+        The evenly spaced sample positions
+    y: np.ndarray
+        The sampled values
+    window: int, default: 7
+        The number of samples fitted
+
+    Returns
+    -------
+    Tuple[float, float, float]
+        The position and the value of the minimum, and the uncertainty of
+        the position. The uncertainty is inf if the minimum is on the edge.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    idx = int(np.argmin(y))
+    if idx in (0, len(y) - 1):
+        return x[idx], y[idx], np.inf
+
+    spacing = abs(x[1] - x[0])
+    half = max(window//2, 1)
+    lo, hi = max(idx - half, 0), min(idx + half + 1, len(y))
+    t = (x[lo:hi] - x[idx])/spacing # in samples from the lowest one
+    design = np.vander(t, 3)
+    (c, b, a), *_ = np.linalg.lstsq(design, y[lo:hi], rcond=None)
+    if c <= 0: # flat or not a minimum
+        return x[idx], y[idx], spacing
+
+    t0 = np.clip(-b/(2*c), t[0], t[-1])
+    denom = y[idx - 1] - 2*y[idx] + y[idx + 1]
+    t3 = 0.5*(y[idx - 1] - y[idx + 1])/denom if denom > 0 else 0.0
+
+    sigma = 0.0
+    dof = len(t) - 3
+    if dof > 0:
+        residual = y[lo:hi] - design @ (c, b, a)
+        cov = residual @ residual/dof*np.linalg.inv(design.T @ design)
+        grad = np.array([b/(2*c**2), -1/(2*c)]) # d(t0)/d(c, b)
+        sigma = np.sqrt(max(grad @ cov[:2, :2] @ grad, 0))
+
+    return x[idx] + t0*spacing, a - b**2/(4*c), np.hypot(sigma, t0 - t3)*spacing
+
+
+def fit_lorentzians(wavelengths: np.ndarray, powers: np.ndarray, db: float=-3.0,
+                    cutoff: float=3.0, distance: int=1, baseline: np.ndarray=None) -> np.ndarray:
+    """
+    Find and fit all the resonance dips of a batch of spectra at once.
+
+    Every dip is modelled as a Lorentzian below a flat baseline A,
+        P = A - B/(1 + ((x - x0)/g)^2),
+    which is linear in its parameters as (A - P)*(a*x^2 + b*x + c) = 1.
+    The weighted least-squares problems of all dips are solved together.
+
+    Parameters
+    ----------
+    wavelengths: np.ndarray
+        The evenly spaced wavelengths, shared by all the spectra or one row per spectrum
+    powers: np.ndarray
+        The linear powers of one spectrum or one row per spectrum
+    db: float, default: -3.0
+        The operating point below the baseline [dB]
+    cutoff: float, default: 3.0
+        The minimum depth of a dip below the maximum of its spectrum [dB]
+    distance: int, default: 1
+        The minimum distance between two dips [samples]
+    baseline: np.ndarray
+        The power off resonance of every spectrum. Default to the 95th percentile.
+
+    Returns
+    -------
+    np.ndarray
+        A structured array of DIP_DTYPE with one entry per dip
+    """
+    from scipy.signal import peak_widths # slow to import, only load when needed
+
+    powers = np.atleast_2d(np.asarray(powers, dtype=float))
+    wavelengths = np.broadcast_to(np.asarray(wavelengths, dtype=float), powers.shape)
+    if baseline is None:
+        baseline = np.percentile(powers, 95, axis=1)
+    baseline = np.broadcast_to(np.asarray(baseline, dtype=float), powers.shape[:1])
+
+    # locate the dips and estimate their widths spectrum by spectrum
+    spectra, peaks, halves = [], [], []
+    for i, row in enumerate(powers):
+        found = resonances(-10*np.log10(row), cutoff=cutoff, distance=distance)
+        if len(found):
+            spectra.append(np.full(len(found), i))
+            peaks.append(found)
+            halves.append(peak_widths(-row, found, rel_height=0.5)[0])
+    dips = np.zeros(sum(map(len, peaks)), dtype=DIP_DTYPE)
+    if not len(dips):
+        return dips
+    spectra, peaks = np.concatenate(spectra), np.concatenate(peaks)
+
+    # fit +-1 FWHM around every dip, padding the shorter windows with zero weights
+    halves = np.maximum(np.ceil(np.concatenate(halves)).astype(int), 2)
+    offsets = np.arange(-halves.max(), halves.max() + 1)
+    idxs = peaks[:, None] + offsets
+    weights = (np.abs(offsets) <= halves[:, None]) & (idxs >= 0) & (idxs < powers.shape[1])
+    idxs = np.clip(idxs, 0, powers.shape[1] - 1)
+
+    spacing = wavelengths[spectra, 1] - wavelengths[spectra, 0]
+    t = wavelengths[spectra[:, None], idxs] - wavelengths[spectra, peaks][:, None]
+    t = t/spacing[:, None] # in samples from the lowest one
+    depth = baseline[spectra, None] - powers[spectra[:, None], idxs]
+    weights = weights & (depth > 0)
+    rows = depth[..., None]*np.stack([t**2, t, np.ones_like(t)], axis=-1) # (dips, samples, 3)
+    rows = rows*weights[..., None]
+    normal = np.einsum("nki,nkj->nij", rows, rows)
+    rhs = rows.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a, b, c = np.einsum("nij,nj->in", np.linalg.pinv(normal), rhs)
+        vertex = c - b**2/(4*a) # 1/B
+        valid = (a > 0) & (vertex > 0)
+        t0 = np.where(valid, -b/(2*a), np.nan)
+        half_width = np.sqrt(vertex/a)*np.abs(spacing) # g
+        amplitude = 1/vertex # B
+        ratio = amplitude/baseline[spectra] # fractional depth
+        # solve 1 - ratio/(1 + u^2) = 10^(db/10) for the detuning u in half widths
+        detuning = np.sqrt(ratio/(1 - 10**(-abs(db)/10)) - 1)
+
+        dips["spectrum"] = spectra
+        dips["index"] = peaks
+        dips["wavelength"] = wavelengths[spectra, peaks] + t0*spacing
+        dips["fwhm"] = np.where(valid, 2*half_width, np.nan)
+        dips["q"] = dips["wavelength"]/dips["fwhm"]
+        dips["extinction"] = np.where(valid, -10*np.log10(np.clip(1 - ratio, 0, None)), np.nan)
+        dips["baseline"] = baseline[spectra]
+        dips["op_wavelength"] = dips["wavelength"] - detuning*half_width
+    return dips
@@ -0,0 +1,249 @@
+"""
+Processing of swept spectra that is shared by the sweep engines.
+"""
+from collections import namedtuple
+from typing import List, Tuple
+import math
+
+import numpy as np
+
+# the average of repeated sweeps, the sweeps are None unless kept
+SweepAverage = namedtuple(
+    "SweepAverage", ["wavelengths", "mean", "std", "count", "rejected", "sweeps"]
+)
+
+
+def plan_segments(start: float, stop: float, step: float, max_points: int,
+                  overlap: float=0.1, cycles: int=1) -> List[Tuple[float, float]]:
+    """
+    Split a sweep into segments that fit in the logging memory.
+
+    Every extra segment adds a sweep setup and an overlap to the wall time,
+    so the fewest segments that fit are used. Their lengths are balanced
+    and the boundaries lie on the step grid, so the overlapping points of
+    neighbouring segments are logged at the same wavelengths.
+
+    Parameters
+    ----------
+    start: float
+        The start wavelength [nm]
+    stop: float
+        The stop wavelength [nm]
+    step: float
+        The step wavelength [pm]
+    max_points: int
+        The maximum number of points logged in one sweep
+    overlap: float
+        The minimum overlap between neighbouring segments [nm]
+    cycles: int
+        The number of cycles of every segment, which are all logged in one sweep
+
+    Returns
+    -------
+    List[Tuple[float, float]]
+        The start and stop wavelength [nm] of every segment
+    """
+    step = step*1e-03
+    max_points = max_points//cycles # points of one cycle
+    intervals = round((stop - start)/step)
+    if intervals < max_points:
+        return [(start, stop)]
+
+    shared = math.ceil(overlap/step) # intervals shared by neighbouring segments
+    if shared >= max_points - 1:
+        raise ValueError("The overlap does not fit in one segment.")
+    count = math.ceil((intervals - shared)/(max_points - 1 - shared))
+    # balance the segments rather than leaving a short one at the end
+    length = math.ceil((intervals + (count - 1)*shared)/count)
+
+    segments = []
+    for i in range(count):
+        first = i*(length - shared)
+        last = min(first + length, intervals)
+        segments.append((round(start + first*step, 6), round(start + last*step, 6)))
+    return segments
+
+
+def stitch_segments(wavelengths: List[np.ndarray],
+                    powers: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stitch overlapping segments of a spectrum into one.
+
+    Each segment is scaled to match the previous one by the median power
+    ratio over their overlap, which removes the offset in dB between
+    sweeps. Half of the overlap is taken from each side.
+
+    Parameters
+    ----------
+    wavelengths: List[np.ndarray]
+        The wavelengths of every segment in ascending order
+    powers: List[np.ndarray]
+        The linear powers of every segment, one column per sensor if 2D
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        The stitched wavelengths and powers
+    """
+    waves = [np.asarray(wavelengths[0])]
+    pows = [np.asarray(powers[0])]
+    for wav, pow_ in zip(wavelengths[1:], powers[1:]):
+        wav = np.asarray(wav)
+        prev_wav, prev_pow = waves[-1], pows[-1]
+        # the number of points shared by both segments
+        shared = min(len(prev_wav) - np.searchsorted(prev_wav, wav[0]),
+                     np.searchsorted(wav, prev_wav[-1], side="right"))
+        if shared <= 0:
+            raise ValueError("The segments do not overlap.")
+
+        ratio = np.median(prev_pow[len(prev_pow) - shared:]/pow_[:shared], axis=0)
+        half = shared//2
+        waves[-1] = prev_wav[:len(prev_wav) - shared + half]
+        pows[-1] = prev_pow[:len(prev_pow) - shared + half]
+        waves.append(wav[half:])
+        pows.append(pow_[half:]*ratio)
+
+    return np.concatenate(waves), np.concatenate(pows)
+
+
+def choose_ranges(pmax: float, pmin: float, ranges: Tuple, span: float=40,
+                  decrement: float=20, headroom: float=3) -> List[float]:
+    """
+    Choose the fixed detector power ranges that cover a measurement.
+
+    The first range is the most sensitive one above the maximum power.
+    More sensitive ranges, decrement apart, are added until the minimum
+    power is within span of the last one.
+
+    Parameters
+    ----------
+    pmax: float
+        The maximum power of the measurement [dBm]
+    pmin: float
+        The minimum power of the measurement [dBm]
+    ranges: Tuple
+        The power ranges of the detector [dBm]
+    span: float, default: 40
+        The dynamic range measured accurately below the top of a range [dB]
+    decrement: float, default: 20
+        The difference between the chosen ranges [dB]
+    headroom: float, default: 3
+        The margin kept above the maximum power [dB]
+
+    Returns
+    -------
+    List[float]
+        The chosen ranges from the least to the most sensitive [dBm]
+    """
+    ranges = np.sort(ranges)
+    above = ranges[ranges >= pmax + headroom]
+    chosen = [above[0] if len(above) else ranges[-1]]
+    while chosen[-1] - span > pmin:
+        lower = ranges[ranges <= chosen[-1] - decrement]
+        if not len(lower):
+            break
+        chosen.append(lower[-1])
+    return [float(prange) for prange in chosen]
+
+
+def stitch_ranges(powers: np.ndarray, ranges: List[float]) -> np.ndarray:
+    """
+    Combine sweeps of the same points taken in different fixed power
+    ranges. Every point is taken from the most sensitive range that it
+    does not saturate.
+
+    Parameters
+    ----------
+    powers: np.ndarray
+        The linear powers [W] with one sweep per range along the first axis
+    ranges: List[float]
+        The power range of every sweep [dBm]
+
+    Returns
+    -------
+    np.ndarray
+        The combined powers [W]
+    """
+    order = np.argsort(ranges) # most sensitive first
+    powers = np.asarray(powers)[order]
+    tops = 10**(np.asarray(ranges, dtype=float)[order]/10 - 3)
+    valid = powers <= tops.reshape(-1, *([1]*(powers.ndim - 1)))
+    # the least sensitive range if every range saturates
+    first = np.where(valid.any(axis=0), valid.argmax(axis=0), len(order) - 1)
+    return np.take_along_axis(powers, first[None], axis=0)[0]
+
+
+class RunningStats:
+    """
+    Streaming mean and variance of equally shaped samples, i.e. sweeps,
+    with Welford's algorithm. Only the running moments are kept, so the
+    memory does not grow with the number of samples.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self._m2 = None
+
+    def add(self, sample: np.ndarray):
+        """ Add one sample. """
+        self.extend(np.asarray(sample)[None])
+
+    def extend(self, samples: np.ndarray):
+        """ Add a batch of samples along the first axis. """
+        samples = np.asarray(samples, dtype=float)
+        count = len(samples)
+        if not count:
+            return
+        mean = samples.mean(axis=0)
+        m2 = ((samples - mean)**2).sum(axis=0)
+        if self.mean is None:
+            self.count, self.mean, self._m2 = count, mean, m2
+            return
+        # merge the moments of the batch with the running ones
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta*count/total
+        self._m2 = self._m2 + m2 + delta**2*self.count*count/total
+        self.count = total
+
+    @property
+    def variance(self) -> np.ndarray:
+        """ The sample variance, nan with fewer than two samples. """
+        if self.count < 2:
+            return None if self.mean is None else np.full_like(self.mean, np.nan)
+        return self._m2/(self.count - 1)
+
+    @property
+    def std(self) -> np.ndarray:
+        """ The sample standard deviation. """
+        variance = self.variance
+        return None if variance is None else np.sqrt(variance)
+
+
+def outlier_cycles(sweeps: np.ndarray, threshold: float=3.0) -> np.ndarray:
+    """
+    Find the sweeps of a batch that disagree with the others, i.e. cycles
+    hit by a mode hop or a mechanical disturbance.
+
+    Every sweep is scored by its RMS deviation from the median sweep, and
+    is an outlier if its score exceeds threshold times the median score.
+    At least three sweeps are needed to tell which one is off.
+
+    Parameters
+    ----------
+    sweeps: np.ndarray
+        The sweeps along the first axis, i.e. cycles x points
+    threshold: float, default: 3.0
+        The score relative to the median score above which a sweep is rejected
+
+    Returns
+    -------
+    np.ndarray
+        A boolean mask of the outlier sweeps
+    """
+    sweeps = np.asarray(sweeps, dtype=float)
+    if len(sweeps) < 3:
+        return np.zeros(len(sweeps), dtype=bool)
+    residual = sweeps - np.median(sweeps, axis=0)
+    score = np.sqrt((residual.reshape(len(sweeps), -1)**2).mean(axis=1))
+    return score > threshold*np.median(score)
@@ -0,0 +1,162 @@
+"""
+Long time series of detector samples, i.e. of power stability measurements.
+
+The samples are appended to a flat binary file of SAMPLE_DTYPE records as
+they arrive, so a run of any length is never held in memory and a crash
+loses at most the samples since the last sync. A DecimatedSummary keeps a
+fixed number of min/mean/max bins over the whole run for quick viewing.
+
+e.g.
+    summary = mm.log_power("stability.bin", duration=4*3600).summary()
+    plt.fill_between(summary["time"], summary["min"], summary["max"])
+    samples = load_timeseries("stability.bin")
+"""
+from pathlib import Path
+import os
+import time
+
+import numpy as np
+
+# one record of the binary file, the time is the unix time of the sample [s]
+SAMPLE_DTYPE = np.dtype([("time", "<f8"), ("power", "<f4")])
+
+# one bin of the summary
+SUMMARY_DTYPE = np.dtype([("time", float), ("min", float), ("mean", float), ("max", float)])
+
+
+class TimeSeriesWriter:
+    """
+    Append timestamped samples to a binary file.
+
+    Parameters
+    ----------
+    filename: Path
+        The file the samples are appended to
+    fsync_interval: float, default: 10.0
+        The time between syncs of the file to the disk [s]
+    """
+    def __init__(self, filename: Path, fsync_interval: float=10.0):
+        self.filename = Path(filename)
+        self.fsync_interval = fsync_interval
+        self.count = 0
+        self._file = open(self.filename, "ab")
+        self._synced = time.monotonic()
+
+    def append(self, times: np.ndarray, powers: np.ndarray):
+        """ Append samples to the file, syncing it if the interval is over. """
+        records = np.empty(len(powers), dtype=SAMPLE_DTYPE)
+        records["time"] = times
+        records["power"] = powers
+        self._file.write(records.tobytes())
+        self.count += len(records)
+        if time.monotonic() - self._synced >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        """ Write the buffered samples through to the disk. """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._synced = time.monotonic()
+
+    def close(self):
+        """ Sync and close the file. """
+        if self._file.closed:
+            return
+        self.sync()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def load_timeseries(filename: Path) -> np.ndarray:
+    """
+    Memory-map the samples of a binary file written by TimeSeriesWriter.
+    A partial record at the end, i.e. after a crash, is ignored.
+    """
+    count = os.path.getsize(filename)//SAMPLE_DTYPE.itemsize
+    if not count:
+        return np.empty(0, dtype=SAMPLE_DTYPE)
+    return np.memmap(filename, dtype=SAMPLE_DTYPE, mode="r", shape=(count,))
+
+
+class DecimatedSummary:
+    """
+    The min, mean and max of a time series in at most a fixed number of
+    bins of equal length.
+
+    Every bin covers the same number of samples, except for the last one
+    that is still filling. Once the bins are used up, neighbouring bins are
+    merged in pairs and every bin covers twice as many samples, so the
+    memory stays constant however long the series grows.
+
+    Parameters
+    ----------
+    bins: int, default: 2000
+        The maximum number of bins
+    """
+    def __init__(self, bins: int=2000):
+        if bins < 2:
+            raise ValueError("The summary needs at least two bins.")
+        self.bins = bins
+        self.width = 1 # samples per bin
+        self.count = 0
+        self._time = np.empty(0)
+        self._min = np.empty(0)
+        self._max = np.empty(0)
+        self._sum = np.empty(0)
+        self._num = np.empty(0, dtype=int)
+
+    def extend(self, times: np.ndarray, values: np.ndarray):
+        """ Add samples in time order. """
+        times = np.asarray(times, dtype=float)
+        values = np.asarray(values, dtype=float)
+        self.count += len(values)
+
+        # top up the last bin first
+        if len(self._num) and self._num[-1] < self.width:
+            fill = min(self.width - self._num[-1], len(values))
+            self._min[-1] = min(self._min[-1], values[:fill].min(initial=np.inf))
+            self._max[-1] = max(self._max[-1], values[:fill].max(initial=-np.inf))
+            self._sum[-1] += values[:fill].sum()
+            self._num[-1] += fill
+            times, values = times[fill:], values[fill:]
+
+        # the remaining samples in new bins, the last one may be partial
+        starts = np.arange(0, len(values), self.width)
+        if len(starts):
+            self._time = np.concatenate([self._time, times[starts]])
+            self._min = np.concatenate([self._min, np.minimum.reduceat(values, starts)])
+            self._max = np.concatenate([self._max, np.maximum.reduceat(values, starts)])
+            self._sum = np.concatenate([self._sum, np.add.reduceat(values, starts)])
+            self._num = np.concatenate([self._num, np.diff(np.append(starts, len(values)))])
+
+        while len(self._num) > self.bins:
+            self._merge()
+
+    def _merge(self):
+        """ Merge neighbouring bins in pairs. """
+        if len(self._num) % 2: # pad with an empty bin
+            self._time = np.append(self._time, np.nan)
+            self._min = np.append(self._min, np.inf)
+            self._max = np.append(self._max, -np.inf)
+            self._sum = np.append(self._sum, 0.0)
+            self._num = np.append(self._num, 0)
+        self._time = self._time[::2]
+        self._min = np.minimum(self._min[::2], self._min[1::2])
+        self._max = np.maximum(self._max[::2], self._max[1::2])
+        self._sum = self._sum[::2] + self._sum[1::2]
+        self._num = self._num[::2] + self._num[1::2]
+        self.width *= 2
+
+    def summary(self) -> np.ndarray:
+        """ The start time, min, mean and max of every bin, in SUMMARY_DTYPE. """
+        summary = np.empty(len(self._num), dtype=SUMMARY_DTYPE)
+        summary["time"] = self._time
+        summary["min"] = self._min
+        summary["mean"] = self._sum/self._num
+        summary["max"] = self._max
+        return summary
@@ -4,13 +4,21 @@ that are used but do not belong to a specific category
 """
 import inspect
 import sys
-import math
-from typing import Dict
+import time
+import warnings
+from collections import deque
+from typing import Dict, Callable, Tuple
 import logging
 
+import numpy as np
 import yaml
 
-from pyoctal.utils.error import error_message, INCOMPATIBLE_OS_ERR, PYTHON_VER_ERROR
+from pyoctal.utils.error import (
+    error_message,
+    INCOMPATIBLE_OS_ERR,
+    PYTHON_VER_ERROR,
+    HW_TIMEOUT_ERR
+)
 from pyoctal.utils.formatter import CustomLogFileFormatter, CustomLogConsoleFormatter
 from . import __python_min_version__, __platform__
 
@@ -88,8 +96,126 @@ def load_config(fpath: str):
         configs = yaml.safe_load(file)
     return DictObj(**configs)
 
+def wait_until(condition: Callable[[], bool], timeout: float=None, interval: float=1e-02,
+               max_interval: float=1, backoff: float=2, delay: float=0) -> int:
+    """
+    Poll a condition with an exponential backoff until it is true.
+
+    Parameters
+    ----------
+    condition: Callable
+        Return true once the wait is over
+    timeout: float
+        The deadline counted from the call [s]. Wait forever if None.
+    interval: float
+        The first polling interval [s]
+    max_interval: float
+        The longest polling interval [s]
+    backoff: float
+        The factor the interval grows by after every unsuccessful poll
+    delay: float
+        Time to sleep before the first poll, i.e. the expected duration [s]
+
+    Returns
+    -------
+    int
+        The number of polls
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    time.sleep(delay)
+    polls = 1
+    while not condition():
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(f"Error code {HW_TIMEOUT_ERR:x}: {error_message[HW_TIMEOUT_ERR]}")
+        wait = interval if deadline is None else min(interval, deadline - time.monotonic())
+        time.sleep(max(wait, 0))
+        interval = min(interval*backoff, max_interval)
+        polls += 1
+    return polls
+
+class SettleDetector:
+    """
+    Decide when a settling reading has become stable.
+
+    The latest samples are kept in a sliding window. The reading is stable
+    once the drift over the window, estimated from a linear fit, is below
+    the tolerance or cannot be told apart from the noise. The time taken to
+    settle is learned, so that the next wait sleeps through most of it
+    before sampling.
+
+    Parameters
+    ----------
+    window: int, default: 8
+        The number of samples tested
+    tol: float, default: 1e-03
+        The largest relative drift over the window
+    confidence: float, default: 2.0
+        The number of standard errors a drift must exceed to be significant
+    holdoff: float, default: 0.5
+        The fraction of the learned settle time slept before sampling
+    alpha: float, default: 0.3
+        The weight of the latest settle time in the learned one
+    timeout: float, default: 10
+        Give up waiting after this long [s]
+    """
+    def __init__(self, window: int=8, tol: float=1e-03, confidence: float=2.0,
+                 holdoff: float=0.5, alpha: float=0.3, timeout: float=10):
+        self.window = window
+        self.tol = tol
+        self.confidence = confidence
+        self.holdoff = holdoff
+        self.alpha = alpha
+        self.timeout = timeout
+        self.learned = None # the learned settle time [s]
+
+    def is_stable(self, times: np.ndarray, values: np.ndarray) -> bool:
+        """ Test whether a window of samples is free of drift. """
+        times = times - times.mean()
+        values = np.asarray(values, dtype=float)
+        slope = times @ (values - values.mean())/(times @ times)
+        residual = values - values.mean() - slope*times
+        stderr = np.sqrt(residual @ residual/(len(values) - 2)/(times @ times))
+        span = times[-1] - times[0]
+        return abs(slope)*span <= max(self.tol*abs(values.mean()), self.confidence*stderr*span)
+
+    def wait(self, read: Callable[[], float]) -> Tuple[float, float]:
+        """
+        Sample a reading until it is stable.
+
+        Parameters
+        ----------
+        read: Callable
+            Return one sample of the reading
+
+        Returns
+        -------
+        Tuple[float, float]
+            The mean of the stable window and the time taken to settle [s],
+            i.e. until the start of the stable window
+        """
+        start = time.perf_counter()
+        if self.learned:
+            time.sleep(self.holdoff*self.learned)
+
+        times = deque(maxlen=self.window)
+        values = deque(maxlen=self.window)
+        while True:
+            values.append(read())
+            times.append(time.perf_counter() - start)
+            if len(values) == self.window and self.is_stable(np.array(times), values):
+                break
+            if times[-1] > self.timeout:
+                warnings.warn("The reading has not settled within the timeout.", RuntimeWarning)
+                return float(np.mean(values)), times[-1]
+
+        # the readings have been stable since the start of the window
+        settle = times[0]
+        self.learned = settle if self.learned is None else \
+            self.alpha*settle + (1 - self.alpha)*self.learned
+        return float(np.mean(values)), settle
+
 def dbm_to_watt(power):
     return pow(10, -3+power/10)
 
 def watt_to_dbm(power):
-    return 10*math.log10(power/pow(10, -3))
+    return 10*np.log10(power/pow(10, -3))
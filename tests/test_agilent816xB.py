@@ -0,0 +1,398 @@
+from types import SimpleNamespace
+import time
+
+import numpy as np
+import pytest
+from pyvisa import ResourceManager
+
+from pyoctal.instruments.agilent816xB import Agilent8164B, ResonanceTracker
+from pyoctal.utils.reference import ReferenceCache
+from pyoctal.utils.spectrum import RunningStats, outlier_cycles, plan_segments
+from pyoctal.utils.timeseries import load_timeseries
+from pyoctal.utils.util import SettleDetector
+
+
+class FakeMainframe:
+    """ Stand-in for a pyvisa resource that emulates the 816xB logging sweep. """
+    def __init__(self):
+        self.writes = []
+        self.binary = []
+        self.start = 1535.0
+        self.stop = 1575.0
+        self.step = 5.0
+        self.rate = None # points logged per progress poll, all at once if None
+        self.done = 0
+        self.gain = 1.0
+        self.drift = 0.0 # relative power change between sweeps
+        self.resonance = 1550.0
+        self.tau = 5e-03 # settling time constant of the detector after a step [s]
+        self.stepped = 0.0
+        self.atime = 0.0
+        self.triggers = {} # trigger configuration and responses by header
+        self.prange = None # locked power range [dBm], autorange if None
+        self.cycles = 1
+        self.cycle_gains = None # relative power of every cycle
+        self.sweeping = True # the detector function logs a sweep, or the power over time
+        self.func_pts = 0
+        self.func_spacing = 0.0
+        self.func_started = 0.0
+        self.func_blocks = 0
+
+    @property
+    def points(self) -> int:
+        return int(round(abs(self.stop - self.start)/self.step*1e03)) + 1
+
+    def spectrum(self, wavelengths: np.ndarray=None) -> np.ndarray:
+        if wavelengths is None:
+            wavelengths = np.linspace(self.start, self.stop, self.points)
+        powers = self.gain*(1e-03 - 9e-04/(1 + ((wavelengths - self.resonance)/0.05)**2))
+        if self.prange is not None: # saturates above the range
+            top = 10**(self.prange/10 - 3)
+            powers = np.where(powers > top, 2*top, powers)
+        return powers
+
+    def logged(self) -> np.ndarray:
+        """ The powers logged over all cycles. """
+        gains = np.ones(self.cycles) if self.cycle_gains is None else np.asarray(self.cycle_gains)
+        return (gains[:, None]*self.spectrum()).ravel()
+
+    def write(self, cmd: str):
+        self.writes.append(cmd)
+        for part in cmd.split(";"):
+            header, _, value = part.lstrip(":").partition(" ")
+            if header.endswith("sweep:start"):
+                self.start = float(value.rstrip("nm"))
+            elif header.endswith("sweep:stop"):
+                self.stop = float(value.rstrip("nm"))
+            elif header.endswith("sweep:step"):
+                self.step = float(value.rstrip("pm"))
+            elif header.endswith("function:parameter:logging"):
+                pts, spacing = value.split(",")
+                self.func_pts, self.func_spacing = int(pts), float(spacing.rstrip("s"))
+            elif header.endswith("function:parameter:stability"):
+                total, period, _ = (float(val.rstrip("s")) for val in value.split(","))
+                self.func_pts, self.func_spacing = round(total/period), period
+            elif header.endswith("function:state") and value.endswith("start"):
+                self.func_started = time.perf_counter()
+                self.sweeping = False
+            elif header.endswith("sweep:cycles"):
+                self.cycles = int(value)
+            elif header.endswith("power:range:auto"):
+                self.prange = None if int(value) else self.prange
+            elif header.endswith("power:range"):
+                self.prange = float(value.rstrip("dBm"))
+            elif header.endswith("power:atime"):
+                self.atime = float(value.rstrip("s"))
+            elif header.startswith("trigger"):
+                self.triggers[header] = value
+            elif header.endswith("wavelength:fixed"):
+                self.stepped = time.perf_counter()
+            elif header.endswith("sweep:state") and value == "start":
+                self.sweeping = True
+                self.done = self.points*self.cycles if self.rate is None else 0
+                self.gain *= 1 + self.drift
+
+    def query(self, cmd: str) -> str:
+        if cmd.endswith("sweep:exp?"):
+            return str(self.points)
+        if cmd.endswith("read:points? llogging"):
+            self.done = min(self.done + (self.rate or self.points), self.points*self.cycles)
+            return str(min(self.done, self.points))
+        if cmd.endswith("power:atime?"):
+            return str(self.atime)
+        if cmd.startswith("trigger"):
+            return self.triggers.get(cmd.rstrip("?"), "DEF")
+        if cmd.endswith("wavelength? MIN"):
+            return "1.48E-06"
+        if cmd.endswith("wavelength? MAX"):
+            return "1.64E-06"
+        if cmd.endswith("power?"):
+            time.sleep(self.atime)
+            settling = np.exp(-(time.perf_counter() - self.stepped)/self.tau)
+            return str(1e-03*(1 + 0.5*settling))
+        if cmd.endswith("function:state?") and not self.sweeping:
+            done = time.perf_counter() - self.func_started >= self.func_pts*self.func_spacing
+            return f"STABILITY,{'COMPLETE' if done else 'PROGRESS'}"
+        if cmd.endswith("function:state?"):
+            return f"LOGGING_STABILITY,{'COMPLETE' if self.done == self.points*self.cycles else 'PROGRESS'}"
+        return "0"
+
+    def query_binary_values(self, cmd: str, datatype: str="f", container=list, **kwargs):
+        self.binary.append(cmd)
+        if cmd.endswith("read:data? llogging"):
+            return np.linspace(self.start, self.stop, self.points)*1e-09
+        if "block?" in cmd:
+            offset, dpts = map(int, cmd.split()[-1].split(","))
+            assert offset + dpts <= self.done
+            return self.logged()[offset:offset + dpts].astype(datatype)
+        if not self.sweeping: # a slow drift over the blocks
+            self.func_blocks += 1
+            drift = (self.func_blocks - 1)*self.func_pts + np.arange(self.func_pts)
+            return (1e-03*(1 + 1e-06*drift)).astype(datatype)
+        return self.logged().astype(datatype)
+
+    def enable_event(self, event_type, mechanism):
+        self.srq = True
+
+    def disable_event(self, event_type, mechanism):
+        self.srq = False
+
+    def discard_events(self, event_type, mechanism):
+        pass
+
+    def wait_on_event(self, event_type, timeout: int, capture_timeout: bool=False):
+        assert self.srq and self.writes[-1].endswith("*OPC") # *OPC is sent before waiting
+        self.events = getattr(self, "events", 0) + 1
+        return SimpleNamespace(timed_out=False)
+
+    def sent(self, cmd: str) -> int:
+        """ The number of times a command has been sent. """
+        return sum(part.lstrip(":") == cmd for write in self.writes for part in write.split(";"))
+
+
+@pytest.fixture
+def mm():
+    rm = ResourceManager("./tests/sim_dev.yaml@sim")
+    dev = Agilent8164B(addr=rm.list_resources()[0], rm=rm)
+    dev._instr = FakeMainframe()
+    yield dev
+    rm.close()
+
+
+def test_run_laser_sweep_auto(mm):
+    wavelengths, powers = mm.run_laser_sweep_auto(power=5, start=1540, stop=1560, step=10,
+                                                  speed=1e04)
+    assert len(wavelengths) == len(powers) == 2001
+    assert mm.instr.sent("source0:channel1:power:level:immediate:amplitude 5dBm") == 1
+    assert mm.instr.sent("*RST") == 1
+
+
+def test_sweep_session_configures_once(mm):
+    with mm.sweep_session(start=1540, stop=1560, step=10, speed=1e04,
+                          reset=False) as session:
+        for _ in range(3):
+            wavelengths, powers = session.run()
+        assert mm.instr.sent("trigger:conf loop") == 1
+        assert mm.instr.sent("source0:channel1:wavelength:sweep:state start") == 3
+        assert len(mm.instr.binary) == 4 # wavelengths are only read once
+
+        session.configure(step=20)
+        wavelengths, _ = session.run()
+        assert len(wavelengths) == session.trigno == 1001
+        assert mm.instr.sent("sense2:channel1:function:parameter:logging 1001,0s") == 1
+    assert mm.instr.sent("*RST") == 0
+
+
+def test_stream_overlaps_acquisition(mm, tmp_path):
+    mm.instr.rate = 700
+    with mm.sweep_session(start=1540, stop=1560, step=10, speed=1e04,
+                          reset=False) as session:
+        chunks = list(session.stream(block=500))
+        assert sum(map(len, chunks)) == session.trigno == 2001
+        assert max(map(len, chunks)) == 500
+        np.testing.assert_allclose(np.concatenate(chunks), mm.instr.spectrum(), rtol=1e-06)
+
+        wavelengths, powers = session.run_to_file(tmp_path / "powers.npy", block=500)
+        assert len(wavelengths) == len(powers)
+    np.testing.assert_allclose(np.load(tmp_path / "powers.npy"), mm.instr.spectrum(), rtol=1e-06)
+
+
+def test_multi_sensor_logging(mm, tmp_path):
+    with mm.sweep_session(start=1540, stop=1560, step=10, speed=1e04, sensors=[(1, 1), (2, 1)],
+                          reset=False) as session:
+        wavelengths, powers = session.run()
+        assert powers.shape == (len(wavelengths), 2)
+        assert mm.instr.sent("source0:channel1:wavelength:sweep:state start") == 1
+        for num in (1, 2):
+            assert mm.instr.sent(f"sense{num}:channel1:function:state logging,start") == 1
+
+        _, powers = session.run_to_file(tmp_path / "powers.npy")
+        assert powers.shape == (2001, 2)
+    assert mm.detect == "sense2:channel1"
+
+
+def test_plan_segments():
+    assert plan_segments(1540, 1560, 10, max_points=5000) == [(1540, 1560)]
+    segments = plan_segments(1500, 1600, 1, max_points=40001, overlap=0.1)
+    assert len(segments) == 3
+    assert segments[0][0] == 1500 and segments[-1][1] == 1600
+    for (_, stop), (start, _) in zip(segments[:-1], segments[1:]):
+        assert stop - start >= 0.1
+
+    # all cycles of a segment are logged in one sweep
+    segments = plan_segments(1500, 1600, 1, max_points=40001, overlap=0.1, cycles=3)
+    assert len(segments) == 8
+    assert all(3*(round((stop - start)*1e03) + 1) <= 40001 for start, stop in segments)
+
+
+def test_segmented_sweep_stitching(mm):
+    mm.max_log_points = 1000
+    mm.instr.gain = 1.0/(1 + 0.2)
+    mm.instr.drift = 0.2
+    mm.instr.prange = -10 # a range left locked too low is released by the autorange
+    wavelengths, powers = mm.run_laser_sweep_segmented(start=1545, stop=1555, step=5,
+                                                       speed=1e04, overlap=0.1)
+    assert mm.instr.prange is None
+    assert len(wavelengths) == len(powers) == 2001
+    assert np.all(np.diff(wavelengths) > 0)
+    # every segment is matched to the first one
+    mm.instr.gain = 1.0
+    np.testing.assert_allclose(powers, mm.instr.spectrum(wavelengths*1e09), rtol=1e-05)
+
+
+def test_search_resonance(mm):
+    mm.instr.write("sense2:channel1:power:atime 0.2s")
+    mm.instr.write("trigger2:channel1:input ign")
+    result = mm.search_resonance(center=1549.8, span=1.0, tol=1e-04, speed=1e04)
+    assert abs(result.wavelength - 1550) < 1e-04
+    assert result.uncertainty <= 1e-04
+    assert result.sweeps == 1
+    assert mm.instr.sent(f"sense2:channel1:power:wavelength {result.wavelength}nm") == 1
+    # the detector reads single powers as before
+    assert mm.instr.atime == 0.2
+    assert mm.instr.triggers["trigger2:channel1:input"] == "ign"
+    assert mm.instr.triggers["trigger:conf"] == "DEF"
+
+    with pytest.raises(ValueError):
+        mm.search_resonance(center=1549.8, max_sweeps=0)
+
+    # a coarse grid cannot resolve the dip, so the search narrows down
+    result = mm.search_resonance(center=1549.8, span=1.0, points=21, tol=1e-04, speed=1e04)
+    assert abs(result.wavelength - 1550) < 1e-04
+    assert result.sweeps > 1
+
+
+@pytest.mark.parametrize("model", ["kalman", "linear"])
+def test_resonance_tracker(mm, model):
+    with mm.sweep_session(speed=1e04, reset=False) as session:
+        tracker = ResonanceTracker(mm, session, center=1549.5, model=model)
+        for volt in np.concatenate([[0], np.linspace(0, 3, 13), [3]]): # repeated biases
+            mm.instr.resonance = 1550 + 0.1*volt**2 # thermal shift
+            result = tracker.update(volt)
+            assert abs(result.wavelength - mm.instr.resonance) < 1e-03
+        assert tracker.lost == 0
+        assert abs(tracker.predict(3.25)[0] - (1550 + 0.1*3.25**2)) < 0.02
+
+        # a jump beyond the window is found again by widening it
+        mm.instr.resonance += 0.6
+        with pytest.warns(RuntimeWarning):
+            result = tracker.update(3.25)
+        assert abs(result.wavelength - mm.instr.resonance) < 1e-03
+        assert tracker.lost == 1
+
+
+def test_find_op_wavelength(mm):
+    wavelength = mm.find_op_wavelength(db=-3, target=1550, xrange=2, step=1, speed=1e04,
+                                       cutoff=3, distance=10)
+    detuning = np.sqrt(0.9/(1 - 10**-0.3) - 1)
+    assert abs(wavelength - (1550 - 0.05*detuning)) < 1e-03
+
+
+def test_run_sweep_manual_settles(mm):
+    wavelengths, powers, settle_times = mm.run_sweep_manual(lambda_start=1549, lambda_stop=1551,
+                                                            lambda_step=0.5, period=2e-03)
+    assert len(wavelengths) == len(powers) == len(settle_times) == 5
+    assert mm.instr.events == 5 # the laser is waited for with a service request per step
+    np.testing.assert_allclose(powers, 1e-03, rtol=2e-03)
+    assert np.all(settle_times < 0.5)
+    # the learned settle time averages the reported ones
+    learned = settle_times[0]
+    for settle in settle_times[1:]:
+        learned = 0.3*settle + 0.7*learned
+    assert mm.settle.learned == pytest.approx(learned)
+
+    started = time.perf_counter()
+    with pytest.warns(RuntimeWarning): # a reading that never settles
+        SettleDetector(timeout=0.02).wait(lambda: time.perf_counter() - started)
+
+    with pytest.raises(ValueError):
+        mm.run_sweep_manual(lambda_start=1400)
+
+
+def test_reference_normalisation(mm, tmp_path):
+    cache = ReferenceCache(tmp_path)
+    with mm.sweep_session(start=1540, stop=1560, step=10, speed=1e04,
+                          reset=False) as session:
+        key = cache.key_for(session)
+        assert key[1:] == ("sense2:channel1", 1540, 1560, 10, None, 1e04)
+        cache.get_or_measure(key, session.run)
+
+        mm.instr.gain = 0.5
+        wavelengths, powers = session.run()
+        np.testing.assert_allclose(cache.insertion_loss(key, wavelengths, powers),
+                                   10*np.log10(2), rtol=1e-05)
+
+
+def test_lock_ranges(mm):
+    mm.setup(reset=False, autorange=False)
+    assert mm.instr.prange == 10 # 0 dBm measured with 3 dB headroom
+
+    with mm.sweep_session(start=1549, stop=1551, step=1, speed=1e04,
+                          reset=False) as session:
+        assert mm.instr.prange == 10 # opening keeps the locked range
+        assert session.lock_ranges() == [10]
+        _, powers = session.run()
+        np.testing.assert_allclose(powers, mm.instr.spectrum(), rtol=1e-06)
+
+        # a dip deeper than the span is measured in two ranges
+        assert session.lock_ranges(span=5) == [10, -10]
+        sweeps = len(mm.instr.binary)
+        _, powers = session.run()
+        assert len(mm.instr.binary) == sweeps + 2
+        mm.instr.prange = None
+        np.testing.assert_allclose(powers, mm.instr.spectrum(), rtol=1e-06)
+
+
+def test_running_stats():
+    rng = np.random.default_rng(0)
+    samples = rng.normal(size=(10, 50))
+    stats = RunningStats()
+    stats.add(samples[0])
+    stats.extend(samples[1:4])
+    stats.extend(samples[4:])
+    assert stats.count == 10
+    np.testing.assert_allclose(stats.mean, samples.mean(axis=0))
+    np.testing.assert_allclose(stats.std, samples.std(axis=0, ddof=1))
+
+    sweeps = 1 + 1e-03*rng.normal(size=(5, 50))
+    sweeps[3] *= 1.1
+    assert outlier_cycles(sweeps).tolist() == [False, False, False, True, False]
+    assert not outlier_cycles(sweeps[:2]).any()
+
+
+def test_multi_cycle_averaging(mm):
+    wavelengths, powers = mm.run_laser_sweep_auto(start=1549, stop=1551, step=10, cycles=3,
+                                                  speed=1e04)
+    assert powers.shape == (3, len(wavelengths)) == (3, 201)
+
+    mm.instr.cycle_gains = [1.0, 1.002, 1.5, 0.998]
+    with mm.sweep_session(start=1549, stop=1551, step=10, speed=1e04, cycles=4,
+                          reset=False) as session:
+        result = session.run_averaged(repeats=2)
+        assert (result.count, result.rejected, result.sweeps) == (6, 2, None)
+        np.testing.assert_allclose(result.mean, mm.instr.spectrum(), rtol=1e-06)
+        np.testing.assert_allclose(result.std, 0.002*np.sqrt(0.8)*mm.instr.spectrum(),
+                                   rtol=1e-04)
+
+        result = session.run_averaged(threshold=None, keep=True)
+        assert result.sweeps.shape == (4, 201)
+        assert result.rejected == 0
+
+
+@pytest.mark.parametrize("period", [None, 2e-04])
+def test_log_power(mm, tmp_path, period):
+    filename = tmp_path / "stability.bin"
+    summary = mm.log_power(filename, duration=0.05, avgtime=1e-04, period=period,
+                           block=100, bins=16)
+    samples = load_timeseries(filename)
+    assert len(samples) == summary.count == 100*mm.instr.func_blocks > 100
+    assert np.all(np.diff(samples["time"]) > 0)
+    np.testing.assert_allclose(samples["power"], 1e-03*(1 + 1e-06*np.arange(len(samples))),
+                               rtol=1e-06)
+
+    bins = summary.summary()
+    assert len(bins) <= 16
+    assert bins["min"][0] == samples["power"][0] and bins["max"][-1] == samples["power"][-1]
+    if period is not None:
+        assert mm.instr.sent("sense2:channel1:function:parameter:stability 0.02s,0.0002s,0.0001s") == 1
+    assert mm.instr.sweeping is False
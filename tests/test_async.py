@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+from pyvisa import ResourceManager
+
+from pyoctal.instruments.base import BaseInstrument, DeviceID
+from pyoctal.instruments.async_base import AsyncInstrument, bus_key
+
+
+class SlowInstrument:
+    """ Stand-in for an instrument whose calls block for a while. """
+    def __init__(self, addr: str):
+        self.address = addr
+
+    def measure(self, delay: float) -> float:
+        time.sleep(delay)
+        return delay
+
+
+def test_bus_key():
+    assert bus_key("GPIB0::5::INSTR") == bus_key("GPIB0::6::INSTR") == "GPIB0"
+    assert bus_key("GPIB::5::INSTR") == "GPIB0"
+    assert bus_key("GPIB1::5::INSTR") == "GPIB1"
+    assert bus_key("TCPIP0::10.0.0.2::INSTR") != bus_key("TCPIP0::10.0.0.3::INSTR")
+
+
+def test_async_query_sim():
+    rm = ResourceManager("./tests/sim_dev.yaml@sim")
+    dev = AsyncInstrument(BaseInstrument(rsc_addr=rm.list_resources()[0], rm=rm))
+
+    async def run():
+        return await dev.query("*IDN?"), await dev.get_idn()
+
+    idn, identity = asyncio.run(run())
+    assert idn == "PyOctal,SIM,MOCK,VERSION_1.0"
+    assert identity == DeviceID(idn)
+    rm.close()
+
+
+def test_bus_serialisation():
+    delay = 0.1
+    same = [AsyncInstrument(SlowInstrument(f"GPIB0::{i}::INSTR")) for i in (5, 6)]
+    other = [AsyncInstrument(SlowInstrument(f"GPIB{i}::5::INSTR")) for i in (0, 1)]
+
+    async def run(devs):
+        start = time.perf_counter()
+        await asyncio.gather(*(dev.measure(delay) for dev in devs))
+        return time.perf_counter() - start
+
+    assert asyncio.run(run(same)) >= 2*delay
+    assert asyncio.run(run(other)) < 2*delay
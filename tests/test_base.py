@@ -0,0 +1,264 @@
+from types import SimpleNamespace
+import shutil
+import time
+
+import numpy as np
+import pytest
+from pyvisa import ResourceManager
+
+from pyoctal.instruments.base import BaseInstrument
+from pyoctal.instruments.pool import SessionPool
+from pyoctal.instruments.thorlabsITC40XX import ThorlabsITC4002QCL
+
+
+class SpySession:
+    """ Stand-in for a pyvisa resource that records all the traffic. """
+    def __init__(self, responses: dict=None):
+        self.writes = []
+        self.queries = []
+        self.responses = responses or {}
+        self.srq_delivered = True
+
+    def write(self, cmd):
+        self.writes.append(cmd)
+
+    def query(self, cmd):
+        self.queries.append(cmd)
+        return self.responses.get(cmd, "0")
+
+    def read_stb(self):
+        self.queries.append("*STB?")
+        self.stb_polls = getattr(self, "stb_polls", 0) + 1
+        return 32 if self.stb_polls >= 3 else 0
+
+    def enable_event(self, event_type, mechanism):
+        pass
+
+    def disable_event(self, event_type, mechanism):
+        pass
+
+    def discard_events(self, event_type, mechanism):
+        self.queries.append("discard")
+
+    def wait_on_event(self, event_type, timeout, capture_timeout=False):
+        self.queries.append(f"wait {timeout} ms after {self.writes[-1]}")
+        return SimpleNamespace(timed_out=not self.srq_delivered)
+
+
+@pytest.fixture
+def instr():
+    rm = ResourceManager("./tests/sim_dev.yaml@sim")
+    dev = BaseInstrument(rsc_addr=rm.list_resources()[0], rm=rm)
+    dev._instr = SpySession({"system:error?": '+0,"No error"', "*OPC?": "1"})
+    yield dev
+    rm.close()
+
+
+def test_batch_joins_writes(instr):
+    with instr.batch():
+        instr.write("source0:power:unit dBm")
+        instr.write("*CLS")
+        instr.write(":trigger:conf loop")
+        assert not instr.instr.writes
+    assert instr.instr.writes == [":source0:power:unit dBm;*CLS;:trigger:conf loop"]
+
+
+def test_batch_respects_max_len(instr):
+    with instr.batch(max_len=20):
+        for i in range(4):
+            instr.write(f"volt {i}")
+    assert instr.instr.writes == [":volt 0;:volt 1", ":volt 2;:volt 3"]
+
+    # the writes flushed by a query keep to the limit as well
+    instr.instr.writes.clear()
+    with instr.batch(max_len=20):
+        for i in range(4):
+            instr.write(f"volt {i}")
+        instr.query("volt?")
+    assert instr.instr.writes == [":volt 0;:volt 1", ":volt 2;:volt 3"]
+
+
+def test_batch_flushes_before_query(instr):
+    with instr.batch():
+        instr.write("volt 1")
+        instr.query("volt?")
+        instr.write("volt 2")
+    assert instr.instr.writes == [":volt 1", ":volt 2"]
+    assert instr.instr.queries == ["volt?"]
+
+
+def test_batch_check_raises_on_error(instr):
+    with instr.batch(check=True):
+        instr.write("volt 1")
+    assert instr.instr.queries == ["*OPC?", "system:error?"]
+
+    instr.instr.responses["system:error?"] = '-113,"Undefined header"'
+    with pytest.raises(RuntimeError):
+        with instr.batch(check=True):
+            instr.write("vlot 1")
+
+
+def test_shadow_skips_repeated_writes(instr):
+    instr.enable_shadow()
+    instr.shadow_coupling = {"apply": ("voltage",), "voltage": ("apply",)}
+    instr.write("apply 1 , 0.1")
+    instr.write("apply 1 , 0.1")
+    instr.write("voltage 2")
+    instr.write("apply 1 , 0.1")
+    instr.write("*RST")
+    instr.write("voltage 2")
+    assert instr.instr.writes == ["apply 1 , 0.1", "voltage 2", "apply 1 , 0.1", "*RST", "voltage 2"]
+    assert instr.shadow_stats == {"sent": 4, "skipped": 1}
+
+    instr.invalidate()
+    instr.write("voltage 2")
+    assert instr.instr.writes[-1] == "voltage 2"
+
+
+def test_shadow_forgets_failed_batch(instr, monkeypatch):
+    instr.enable_shadow()
+    def fail(cmd):
+        raise OSError("bus error")
+    with monkeypatch.context() as patch:
+        patch.setattr(instr.instr, "write", fail)
+        with pytest.raises(OSError):
+            with instr.batch():
+                instr.write("volt 1")
+    instr.write("volt 1")
+    assert instr.instr.writes == ["volt 1"]
+
+
+def test_cached_query(instr):
+    instr.instr.responses["*IDN?"] = "PyOctal,SIM,MOCK,VERSION_1.0"
+    instr.invalidate()
+    stats = instr.cache_stats
+    idn = instr.get_idn()
+    assert instr.get_idn() is idn
+    assert instr.instr.queries.count("*IDN?") == 1
+
+    instr.reset()
+    instr.get_idn()
+    assert instr.instr.queries.count("*IDN?") == 2
+    assert instr.cache_stats["hits"] == stats["hits"] + 1
+    assert instr.cache_stats["misses"] == stats["misses"] + 2
+
+
+
+def test_cached_query_cleared_by_setter():
+    rm = ResourceManager("./tests/sim_dev.yaml@sim")
+    itc = ThorlabsITC4002QCL(addr=rm.list_resources()[0], rm=rm)
+    itc._instr = SpySession({"source:current? max": "0.5"})
+    itc.set_curr(0.1)
+    itc.set_curr(0.2)
+    assert itc.instr.queries.count("source:current? max") == 1
+
+    itc.set_curr_limit(1.0)
+    itc.instr.responses["source:current? max"] = "1.0"
+    itc.set_curr(0.8)
+    assert itc.instr.queries.count("source:current? max") == 2
+    rm.close()
+
+def test_session_pool(monkeypatch):
+    pool = SessionPool(idle_timeout=0)
+    monkeypatch.setattr(BaseInstrument, "session_pool", pool)
+    rm = ResourceManager("./tests/sim_dev.yaml@sim")
+    addr = rm.list_resources()[0]
+
+    dev1 = BaseInstrument(rsc_addr=addr, rm=rm)
+    dev2 = BaseInstrument(rsc_addr=addr, rm=rm)
+    assert dev1.instr is dev2.instr
+    assert dev1.identity is dev2.identity
+    assert len(pool) == 1
+
+    dev1.close()
+    assert addr in pool
+    dev2.close()
+    assert addr not in pool
+    rm.close()
+
+
+def test_fast_connect(monkeypatch, tmp_path):
+    monkeypatch.setattr(BaseInstrument, "fast_connect", True)
+    BaseInstrument.clear_connect_cache()
+    rm = ResourceManager("./tests/sim_dev.yaml@sim")
+    addr = rm.list_resources()[0]
+
+    dev = BaseInstrument(rsc_addr=addr, rm=rm)
+    resources = dev.list_resources()
+    monkeypatch.setattr(rm, "list_resources", lambda *args: pytest.fail("enumerated"))
+    monkeypatch.setattr(BaseInstrument, "get_idn", lambda self: pytest.fail("identified"))
+    assert BaseInstrument(rsc_addr=addr, rm=rm).identity is dev.identity
+    assert dev.list_resources() is resources
+
+    # another resource manager, i.e. another backend, identifies the device again
+    monkeypatch.undo()
+    monkeypatch.setattr(BaseInstrument, "fast_connect", True)
+    shutil.copy("./tests/sim_dev.yaml", tmp_path / "sim_dev.yaml")
+    other = ResourceManager(f"{tmp_path / 'sim_dev.yaml'}@sim")
+    assert other is not rm
+    assert BaseInstrument(rsc_addr=addr, rm=other).identity is not dev.identity
+
+    BaseInstrument.clear_connect_cache()
+    other.close()
+    rm.close()
+
+
+def test_query_binary_array_writeable(instr):
+    block = np.arange(4, dtype="<f4").tobytes()
+    instr.instr.query_binary_values = lambda cmd, **kwargs: np.frombuffer(block, dtype="<f4")
+    data = instr.query_binary_array("trace?", dtype=float)
+    assert data.dtype == np.dtype(float)
+    data[data < 2] = 0 # callers may clip in place
+    assert data.tolist() == [0, 0, 2, 3]
+
+
+def test_profiler(instr, tmp_path):
+    with instr.profile() as prof:
+        instr.write("volt 1")
+        instr.query("volt?")
+        instr.query("volt?")
+    instr.write("volt 2")
+
+    assert len(prof) == 3
+    stats = prof.histograms()
+    key = (f"BaseInstrument@{instr.address}", "volt?")
+    assert stats[key]["count"] == 2
+    assert stats[key]["bytes"] == 2*len("volt?0")
+    assert stats[key]["p50"] <= stats[key]["p99"]
+
+    prof.to_csv(tmp_path / "profile.csv")
+    prof.to_json(tmp_path / "profile.json")
+    assert (tmp_path / "profile.csv").read_text().count("\n") == 4
+
+
+def test_wait_for_backoff(instr):
+    start = time.monotonic()
+    polls = instr.wait_for(lambda: time.monotonic() - start > 0.1, interval=1e-02)
+    assert polls <= 5
+
+    with pytest.raises(TimeoutError):
+        instr.wait_for(lambda: False, timeout=0.05)
+
+
+def test_wait_opc(instr):
+    instr.wait_opc(timeout=1, interval=1e-03)
+    assert instr.instr.writes == ["*ESE 1", "*OPC"]
+    assert instr.instr.queries == ["*ESR?", "*STB?", "*STB?", "*STB?", "*ESR?"]
+
+    # the *OPC queued in a batch is sent before waiting on the service request
+    instr.srq_supported = True
+    instr.instr.writes.clear()
+    instr.instr.queries.clear()
+    with instr.batch():
+        instr.write("volt 1")
+        instr.wait_opc(timeout=5)
+    assert instr.instr.queries == ["*ESR?", "discard", "wait 1000 ms after *OPC", "*ESR?"]
+
+    # an interface that never delivers the service request falls back to polling
+    instr.instr.srq_delivered = False
+    instr.instr.stb_polls = 0
+    instr.instr.queries.clear()
+    instr.wait_opc(timeout=0.5, interval=1e-03)
+    assert instr.instr.queries == [
+        "*ESR?", "discard", "wait 500 ms after *OPC", "*STB?", "*STB?", "*STB?", "*ESR?"
+    ]
@@ -0,0 +1,20 @@
+import subprocess
+import sys
+
+import pyoctal.instruments
+
+
+def test_lazy_drivers():
+    """ Importing the package or a driver must not pull in the heavy optional dependencies. """
+    stmt = (
+        "import sys; from pyoctal.instruments import *; "
+        "print(','.join(m for m in ('scipy', 'matplotlib', 'pandas') if m in sys.modules))"
+    )
+    proc = subprocess.run([sys.executable, "-c", stmt], capture_output=True, text=True, check=True)
+    assert proc.stdout.strip() == ""
+
+
+def test_public_names():
+    for name in pyoctal.instruments.__all__:
+        assert getattr(pyoctal.instruments, name).__name__ == name
+    assert set(pyoctal.instruments.__all__) <= set(dir(pyoctal.instruments))
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from pyoctal.utils.omr import extract_graphs
+
+
+class FakeGraph:
+    def __init__(self, ydata, start: float=1.54e-06):
+        self.xStart = start
+        self.xStep = 1e-12
+        self.dataPerCurve = 5
+        self.YData = tuple(ydata)
+
+
+class FakeOMR:
+    def __init__(self):
+        self.graphs = {
+            "RXTXAvgIL": FakeGraph(range(5)),
+            "RXTXPDL": FakeGraph(range(10)), # two channels
+            "RXTXMinIL": FakeGraph(range(5), start=1.55e-06),
+        }
+
+    def Graph(self, name):
+        return self.graphs[name]
+
+
+def test_extract_graphs():
+    graphs = extract_graphs(FakeOMR(), ("RXTXAvgIL", "RXTXPDL"))
+    np.testing.assert_allclose(graphs["wavelength"], 1540 + 1e-03*np.arange(5))
+    np.testing.assert_array_equal(graphs["RXTXAvgIL"], np.arange(5))
+    np.testing.assert_array_equal(graphs["RXTXPDL"], np.arange(10).reshape(2, 5).T)
+
+    with pytest.raises(ValueError):
+        extract_graphs(FakeOMR(), ("RXTXAvgIL", "RXTXMinIL"))
@@ -0,0 +1,102 @@
+import threading
+
+import numpy as np
+import pytest
+
+from pyoctal.utils.pipeline import Pipeline, run_pipelined
+
+
+class FakeILME:
+    """
+    Stand-in for KeysightILME. The transfer of a result waits until the
+    measurement of the next point has started, so it only finishes if the
+    two overlap.
+    """
+    def __init__(self, points: int, overlap: bool=True):
+        self.started = [threading.Event() for _ in range(points)]
+        self.overlap = overlap
+        self.events = []
+        self.busy = False
+        self.bias = 0
+
+    def measure(self) -> int:
+        assert not self.busy
+        self.busy = True
+        self.events.append(("measure", self.bias))
+        self.started[self.bias].set()
+        self.busy = False
+        return self.bias
+
+    def read_result(self, result: int):
+        overlapped = False
+        if self.overlap and result + 1 < len(self.started):
+            overlapped = self.started[result + 1].wait(timeout=5)
+        self.events.append(("read", result))
+        wavelengths = np.linspace(1540, 1560, 11)
+        return wavelengths, np.full(11, -result), threading.current_thread().name, overlapped
+
+
+def sweep(ilme: FakeILME, biases: list, pipelined: bool):
+    def measure(bias):
+        ilme.bias = bias
+        return ilme.measure()
+
+    def export(bias, result):
+        _, loss, thread, overlapped = ilme.read_result(result)
+        return bias, loss[0], thread, overlapped
+
+    if pipelined:
+        return run_pipelined(biases, measure, export)
+    return [export(bias, measure(bias)) for bias in biases]
+
+
+def test_pipelined_ilme_sweep():
+    biases = list(range(10))
+    serial = sweep(FakeILME(len(biases), overlap=False), biases, pipelined=False)
+    ilme = FakeILME(len(biases))
+    results = sweep(ilme, biases, pipelined=True)
+
+    assert [(bias, loss) for bias, loss, *_ in results] == [(bias, -bias) for bias in biases]
+    assert {thread for _, _, thread, _ in results} == {"pipeline"}
+    assert [result[:2] for result in serial] == [result[:2] for result in results]
+
+    # every result is read after its own measurement, in order, and while
+    # the next point is measured
+    assert [bias for event, bias in ilme.events if event == "read"] == biases
+    for bias in biases:
+        assert ilme.events.index(("measure", bias)) < ilme.events.index(("read", bias))
+    assert all(overlapped for *_, overlapped in results[:-1])
+
+
+def test_pipeline_backpressure_and_errors():
+    processed = []
+    taken = threading.Event()
+    release = threading.Event()
+    def process(item):
+        taken.set()
+        release.wait(timeout=5)
+        if item == 3:
+            raise OSError("disk full")
+        processed.append(item)
+
+    pipeline = Pipeline(process, maxsize=1)
+    pipeline.submit(0)
+    assert taken.wait(timeout=5)
+    pipeline.submit(1) # fills the queue
+
+    submitted = threading.Event()
+    def submit():
+        pipeline.submit(2)
+        submitted.set()
+    thread = threading.Thread(target=submit)
+    thread.start()
+    assert not submitted.wait(timeout=0.05) # waits for the worker
+    release.set()
+    assert submitted.wait(timeout=5)
+    thread.join()
+
+    pipeline.submit(3)
+    with pytest.raises(RuntimeError):
+        pipeline.submit(4)
+        pipeline.close()
+    assert processed == [0, 1, 2]
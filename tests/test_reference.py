@@ -0,0 +1,36 @@
+import numpy as np
+
+from pyoctal.utils.reference import ReferenceCache, interp_columns
+
+
+def test_interp_columns():
+    xp = np.linspace(0, 1, 11)
+    fp = np.column_stack([xp, 2*xp])
+    x = np.array([-1, 0.25, 0.55, 2])
+    np.testing.assert_allclose(interp_columns(x, xp, fp[:, 0]), np.interp(x, xp, fp[:, 0]))
+    np.testing.assert_allclose(interp_columns(x, xp, fp)[:, 1], np.interp(x, xp, fp[:, 1]))
+
+
+def test_reference_cache(tmp_path):
+    cache = ReferenceCache(tmp_path, max_age=60)
+    key = cache.key("MY123:source0:channel1", "sense2:channel1", 1540, 1560, 10, 5, 5)
+    assert key not in cache
+
+    wavelengths = np.linspace(1540e-09, 1560e-09, 2001)
+    calls = []
+    def measure():
+        calls.append(1)
+        return wavelengths, np.full_like(wavelengths, 1e-03)
+    cache.get_or_measure(key, measure)
+    cache.get_or_measure(key, measure)
+    assert len(calls) == 1 and key in cache
+
+    # normalised on a different axis
+    axis = np.linspace(1545e-09, 1555e-09, 101)
+    loss = cache.insertion_loss(key, axis, np.full_like(axis, 1e-04))
+    np.testing.assert_allclose(loss, 10)
+
+    cache.max_age = 0
+    assert key not in cache
+    cache.clear()
+    assert not list(tmp_path.glob("*.npz"))
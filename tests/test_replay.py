@@ -0,0 +1,90 @@
+import numpy as np
+from pyvisa import ResourceManager
+import pytest
+
+from pyoctal.instruments.base import BaseInstrument
+from pyoctal.instruments.replay import RecordingResourceManager, ReplayResourceManager
+
+
+def record(tmp_path):
+    """ Record a short session against the simulated device. """
+    rm = RecordingResourceManager(ResourceManager("./tests/sim_dev.yaml@sim"))
+    addr = rm.list_resources()[0]
+    dev = BaseInstrument(rsc_addr=addr, rm=rm)
+    dev.write("data:encd asci")
+    dev.query("*IDN?")
+    rm.save(tmp_path / "session.json")
+    rm.save_sim_yaml(tmp_path / "session.yaml")
+    rm.close()
+    return addr
+
+
+def test_replay(tmp_path):
+    addr = record(tmp_path)
+    rm = ReplayResourceManager(tmp_path / "session.json", strict=True)
+    dev = BaseInstrument(rsc_addr=addr, rm=rm)
+    dev.write("data:encd asci")
+    assert dev.query("*IDN?") == "PyOctal,SIM,MOCK,VERSION_1.0"
+    with pytest.raises(ValueError):
+        dev.query("*OPC?")
+
+
+def test_sim_yaml(tmp_path):
+    addr = record(tmp_path)
+    rm = ResourceManager(f"{tmp_path / 'session.yaml'}@sim")
+    dev = BaseInstrument(rsc_addr=addr, rm=rm)
+    assert dev.query("*IDN?") == "PyOctal,SIM,MOCK,VERSION_1.0"
+    rm.close()
+
+
+def test_replay_binary_array(tmp_path):
+    rm = RecordingResourceManager(ResourceManager("./tests/sim_dev.yaml@sim"))
+    addr = rm.list_resources()[0]
+    dev = BaseInstrument(rsc_addr=addr, rm=rm)
+    rm.logs[addr].append(
+        {"op": "query_binary", "cmd": "trace?", "rsp": [1.0, 2.0, 3.0], "elapsed": 0}
+    )
+    rm.save(tmp_path / "session.json")
+
+    dev = BaseInstrument(rsc_addr=addr, rm=ReplayResourceManager(tmp_path / "session.json"))
+    data = dev.query_binary_array("trace?", datatype="d", is_big_endian=True)
+    assert isinstance(data, np.ndarray)
+    assert data.dtype == np.dtype(">f8")
+    assert data.tolist() == [1.0, 2.0, 3.0]
+
+
+def test_replay_wait_opc(tmp_path, caplog):
+    rm = RecordingResourceManager(ResourceManager("./tests/sim_dev.yaml@sim"))
+    addr = rm.list_resources()[0]
+    dev = BaseInstrument(rsc_addr=addr, rm=rm)
+    rm.logs[addr].extend([
+        # serial polled
+        {"op": "query", "cmd": "*ESR?", "rsp": "0", "elapsed": 0},
+        {"op": "write", "cmd": "*ESE 1", "elapsed": 0},
+        {"op": "write", "cmd": "*OPC", "elapsed": 0},
+        {"op": "stb", "cmd": "*STB?", "rsp": 0, "elapsed": 0},
+        {"op": "stb", "cmd": "*STB?", "rsp": 32, "elapsed": 0},
+        {"op": "query", "cmd": "*ESR?", "rsp": "1", "elapsed": 0},
+        # service request
+        {"op": "query", "cmd": "*ESR?", "rsp": "0", "elapsed": 0},
+        {"op": "write", "cmd": "*ESE 1", "elapsed": 0},
+        {"op": "write", "cmd": "*SRE 32", "elapsed": 0},
+        {"op": "write", "cmd": "*OPC", "elapsed": 0},
+        {"op": "event", "cmd": "1073684491", "rsp": False, "elapsed": 0},
+        {"op": "query", "cmd": "*ESR?", "rsp": "1", "elapsed": 0},
+    ])
+    rm.save(tmp_path / "session.json")
+    rm.save_sim_yaml(tmp_path / "session.yaml")
+    assert "Skipped stb transaction '*STB?'" in caplog.text
+    assert "Skipped event transaction '1073684491'" in caplog.text
+
+    # record the replay to check that every transaction is served in order
+    replay = RecordingResourceManager(ReplayResourceManager(tmp_path / "session.json", strict=True))
+    dev = BaseInstrument(rsc_addr=addr, rm=replay)
+    dev.wait_opc(timeout=1, interval=1e-03)
+    dev.srq_supported = True
+    dev.wait_opc(timeout=1)
+    assert replay.logs[addr] == [
+        {**event, "elapsed": replay.logs[addr][i]["elapsed"]}
+        for i, event in enumerate(rm.logs[addr])
+    ]
@@ -0,0 +1,45 @@
+import numpy as np
+
+from pyoctal.utils.resonance import fit_lorentzians, fit_minimum
+
+
+def lorentzian_dips(wavelengths: np.ndarray, centres, depth: float=0.9,
+                    half_width: float=0.02) -> np.ndarray:
+    """ A spectrum with Lorentzian dips below a 1 mW baseline. """
+    dips = sum(depth/(1 + ((wavelengths - centre)/half_width)**2) for centre in centres)
+    return 1e-03*(1 - dips)
+
+
+def test_fit_minimum():
+    x = np.linspace(1549, 1551, 201)
+    powers = lorentzian_dips(x, [1550.0123], half_width=0.1)
+    wavelength, power, uncertainty = fit_minimum(x, powers)
+    assert abs(wavelength - 1550.0123) < uncertainty + 1e-04
+    assert abs(power - 1e-04) < 5e-06
+    assert np.isinf(fit_minimum(x, x)[2]) # minimum on the edge
+
+
+def test_fit_lorentzians_batch():
+    x = np.linspace(1540, 1560, 20001)
+    centres = np.array([[1545.0, 1552.3], [1545.2, 1552.5], [1545.4, 1552.7]])
+    rng = np.random.default_rng(0)
+    powers = np.stack([lorentzian_dips(x, row) for row in centres])
+    powers += rng.normal(0, 1e-06, powers.shape)
+
+    dips = fit_lorentzians(x, powers, db=-3, cutoff=3, distance=100)
+    assert len(dips) == 6
+    np.testing.assert_array_equal(dips["spectrum"], [0, 0, 1, 1, 2, 2])
+    np.testing.assert_allclose(dips["wavelength"], centres.ravel(), atol=1e-04)
+    np.testing.assert_allclose(dips["q"], centres.ravel()/0.04, rtol=0.01)
+    np.testing.assert_allclose(dips["extinction"], 10, atol=0.1)
+
+    # 1 - 0.9/(1 + u^2) = 10^(-0.3)
+    detuning = np.sqrt(0.9/(1 - 10**-0.3) - 1)
+    np.testing.assert_allclose(dips["op_wavelength"], centres.ravel() - detuning*0.02,
+                               atol=2e-04)
+
+
+def test_resonances_reexported():
+    from pyoctal.instruments.agilent816xB import resonances as driver_resonances
+    from pyoctal.utils.resonance import resonances
+    assert driver_resonances is resonances
@@ -0,0 +1,36 @@
+import numpy as np
+
+from pyoctal.utils.timeseries import DecimatedSummary, TimeSeriesWriter, load_timeseries
+
+
+def test_decimated_summary():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=1000)
+    times = np.arange(1000)*0.1
+
+    summary = DecimatedSummary(bins=8)
+    for start in range(0, 1000, 37): # blocks that do not line up with the bins
+        summary.extend(times[start:start + 37], values[start:start + 37])
+    bins = summary.summary()
+
+    assert summary.count == 1000
+    assert summary.width == 128 and len(bins) == 8
+    np.testing.assert_allclose(bins["time"], times[::128])
+    for i, lo in enumerate(range(0, 1000, 128)):
+        chunk = values[lo:lo + 128]
+        assert bins["min"][i] == chunk.min() and bins["max"][i] == chunk.max()
+        np.testing.assert_allclose(bins["mean"][i], chunk.mean())
+
+
+def test_timeseries_file(tmp_path):
+    filename = tmp_path / "powers.bin"
+    with TimeSeriesWriter(filename, fsync_interval=0) as writer:
+        writer.append([0.0, 1.0], [1e-03, 2e-03])
+    with TimeSeriesWriter(filename) as writer: # appends
+        writer.append([2.0], [3e-03])
+    with open(filename, "ab") as file: # a record cut short
+        file.write(b"\x00"*5)
+
+    samples = load_timeseries(filename)
+    assert samples["time"].tolist() == [0.0, 1.0, 2.0]
+    np.testing.assert_allclose(samples["power"], [1e-03, 2e-03, 3e-03], rtol=1e-06)
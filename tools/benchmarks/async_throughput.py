@@ -0,0 +1,100 @@
+"""
+async_throughput.py
+===================
+Compare the query throughput of the synchronous drivers with AsyncInstrument
+when the instruments are spread across different buses.
+
+pyvisa-sim answers instantly, so a fixed bus latency is emulated for every
+transaction to mimic a real GPIB/LAN round-trip.
+
+To run this script:
+    python -m tools.benchmarks.async_throughput [--latency 0.005] [--queries 50]
+"""
+from argparse import ArgumentParser
+import asyncio
+import time
+
+from pyvisa import ResourceManager
+
+from pyoctal.instruments.base import BaseInstrument
+from pyoctal.instruments.async_base import AsyncInstrument
+
+SIM_FILE = "tools/benchmarks/sim_bench.yaml@sim"
+
+
+class LatencySession:
+    """ Delay every transaction of a pyvisa resource by a fixed latency. """
+    def __init__(self, session, latency: float):
+        self._session = session
+        self._latency = latency
+
+    def write(self, cmd):
+        time.sleep(self._latency)
+        return self._session.write(cmd)
+
+    def query(self, cmd):
+        time.sleep(self._latency)
+        return self._session.query(cmd)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+def open_instruments(rm: ResourceManager, latency: float):
+    """ Open one instrument per simulated resource. """
+    instrs = []
+    for addr in rm.list_resources():
+        instr = BaseInstrument(rsc_addr=addr, rm=rm)
+        instr._instr = LatencySession(instr.instr, latency)
+        instrs.append(instr)
+    return instrs
+
+
+def run_sync(instrs, queries: int) -> float:
+    """ Query every instrument one after another. """
+    start = time.perf_counter()
+    for _ in range(queries):
+        for instr in instrs:
+            instr.query_float("measure?")
+    return time.perf_counter() - start
+
+
+def run_async(instrs, queries: int) -> float:
+    """ Query all instruments concurrently. """
+    async_instrs = [AsyncInstrument(instr) for instr in instrs]
+
+    async def worker(instr):
+        for _ in range(queries):
+            await instr.query_float("measure?")
+
+    async def main():
+        await asyncio.gather(*(worker(instr) for instr in async_instrs))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return time.perf_counter() - start
+
+
+def main():
+    """ Entry point."""
+    parser = ArgumentParser()
+    parser.add_argument("--latency", type=float, default=5e-03, help="Bus latency [s]")
+    parser.add_argument("--queries", type=int, default=50, help="Queries per instrument")
+    args = parser.parse_args()
+
+    rm = ResourceManager(SIM_FILE)
+    instrs = open_instruments(rm, args.latency)
+    total = args.queries*len(instrs)
+
+    sync_time = run_sync(instrs, args.queries)
+    async_time = run_async(instrs, args.queries)
+
+    print(f"{len(instrs)} instruments on separate buses, {total} queries, "
+          f"{args.latency*1e3:.1f} ms latency")
+    print(f"{'sync':<6}: {sync_time:.3f} s ({total/sync_time:.0f} queries/s)")
+    print(f"{'async':<6}: {async_time:.3f} s ({total/async_time:.0f} queries/s)")
+    rm.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+import_time.py
+==============
+Measure the import time of the instrument package with `python -X importtime`
+and fail if it is over budget or pulls in a heavy optional dependency.
+
+To run this script:
+    python -m tools.benchmarks.import_time [--budget 0.5] [--stmt "import pyoctal.instruments"]
+"""
+from argparse import ArgumentParser
+from typing import List, Tuple
+import subprocess
+import sys
+
+# dependencies that must only be imported when a feature needs them
+HEAVY_MODULES = ("scipy", "matplotlib", "pandas")
+
+
+def measure(stmt: str) -> Tuple[dict, List[str]]:
+    """
+    Run a statement in a fresh interpreter.
+
+    Returns
+    -------
+    Tuple[dict, List[str]]
+        The cumulative import time [s] of every top-level module imported,
+        and the names of all the modules imported at any depth
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", stmt],
+        capture_output=True, text=True, check=True
+    )
+    modules = {}
+    names = []
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        names.append(name.strip())
+        if not name.startswith("  "): # nested imports are indented
+            modules[name.strip()] = int(cumulative)*1e-06
+    return modules, names
+
+
+def main():
+    """ Entry point."""
+    parser = ArgumentParser()
+    parser.add_argument("--stmt", default="import pyoctal.instruments",
+                        help="Statement to time")
+    parser.add_argument("--budget", type=float, default=0.5, help="Time budget [s]")
+    args = parser.parse_args()
+
+    modules, names = measure(args.stmt)
+    total = sum(modules.values())
+    # a heavy module imported by a nested dependency is still a regression
+    heavy = sorted({name.split(".")[0] for name in names} & set(HEAVY_MODULES))
+
+    for name, cumulative in sorted(modules.items(), key=lambda item: -item[1])[:10]:
+        print(f"{name:<40}: {cumulative*1e3:8.1f} ms")
+    print(f"{'total':<40}: {total*1e3:8.1f} ms (budget {args.budget*1e3:.0f} ms)")
+
+    if heavy:
+        sys.exit(f"Heavy modules imported eagerly: {', '.join(heavy)}")
+    if total > args.budget:
+        sys.exit("Import time is over budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+pipelined_sweep.py
+==================
+Compare a bias sweep that exports every ILME result before measuring the
+next point (serial) with one that exports in a worker thread (pipelined),
+and fail if the pipeline does not save the expected time.
+
+The measurement and the result transfer of the engine are emulated by
+fixed delays, so the ideal pipelined time is the sum of the measurements
+plus the last transfer.
+
+To run this script:
+    python -m tools.benchmarks.pipelined_sweep [--points 20] [--tmeas 0.02] [--tread 0.02]
+"""
+from argparse import ArgumentParser
+import sys
+import time
+
+from pyoctal.utils.pipeline import run_pipelined
+
+
+def sweep(points: int, tmeas: float, tread: float, pipelined: bool) -> float:
+    """ Run one emulated sweep and get its wall time [s]. """
+    def measure(bias):
+        time.sleep(tmeas)
+        return bias
+
+    def export(bias, result):
+        time.sleep(tread)
+        return bias, result
+
+    start = time.perf_counter()
+    if pipelined:
+        run_pipelined(range(points), measure, export)
+    else:
+        for bias in range(points):
+            export(bias, measure(bias))
+    return time.perf_counter() - start
+
+
+def main():
+    """ Entry point."""
+    parser = ArgumentParser()
+    parser.add_argument("--points", type=int, default=20, help="Bias points")
+    parser.add_argument("--tmeas", type=float, default=2e-02, help="Measurement time [s]")
+    parser.add_argument("--tread", type=float, default=2e-02, help="Result transfer time [s]")
+    parser.add_argument("--min-speedup", type=float, default=1.3,
+                        help="The speedup below which the benchmark fails")
+    args = parser.parse_args()
+
+    serial_time = sweep(args.points, args.tmeas, args.tread, pipelined=False)
+    pipelined_time = sweep(args.points, args.tmeas, args.tread, pipelined=True)
+    ideal_time = args.points*max(args.tmeas, args.tread) + min(args.tmeas, args.tread)
+    speedup = serial_time/pipelined_time
+
+    print(f"{args.points} points, {args.tmeas*1e3:.1f} ms measurement, "
+          f"{args.tread*1e3:.1f} ms transfer")
+    print(f"{'serial':<10}: {serial_time:.3f} s")
+    print(f"{'pipelined':<10}: {pipelined_time:.3f} s (ideal {ideal_time:.3f} s)")
+    print(f"{'speedup':<10}: {speedup:.2f}x")
+
+    if speedup < args.min_speedup:
+        sys.exit(f"The pipeline is slower than expected ({speedup:.2f}x < {args.min_speedup}x).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+startup.py
+==========
+Compare the construction time of every driver in the default connect mode
+(cold) with the fast connect mode once the devices have been identified (warm).
+
+The drivers are constructed against the simulated backend in tests/sim_dev.yaml.
+
+To run this script:
+    python -m tools.benchmarks.startup [--repeat 20]
+"""
+from argparse import ArgumentParser
+import time
+
+from pyvisa import ResourceManager
+
+import pyoctal.instruments as instruments
+from pyoctal.instruments.base import BaseInstrument
+
+SIM_FILE = "tests/sim_dev.yaml@sim"
+# drivers that cannot talk to the simulated device
+UNTESTABLE = ("FiberlabsAMP", "KeysightILME", "ThorlabsAPT")
+
+
+def construct_all(rm: ResourceManager, addr: str, repeat: int) -> float:
+    """ Construct every driver repeat times and return the mean time per driver. """
+    names = [name for name in instruments.__all__ if name not in UNTESTABLE]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for name in names:
+            getattr(instruments, name)(addr=addr, rm=rm)
+    return (time.perf_counter() - start)/(repeat*len(names))
+
+
+def main():
+    """ Entry point."""
+    parser = ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20, help="Constructions per driver")
+    args = parser.parse_args()
+
+    rm = ResourceManager(SIM_FILE)
+    addr = rm.list_resources()[0]
+
+    BaseInstrument.fast_connect = False
+    cold = construct_all(rm, addr, args.repeat)
+
+    BaseInstrument.fast_connect = True
+    BaseInstrument.clear_connect_cache()
+    construct_all(rm, addr, 1) # first contact fills in the caches
+    warm = construct_all(rm, addr, args.repeat)
+
+    print(f"{'cold':<5}: {cold*1e3:.3f} ms per driver")
+    print(f"{'warm':<5}: {warm*1e3:.3f} ms per driver ({cold/warm:.1f}x faster)")
+    rm.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -16,12 +16,14 @@ import pickle
 from tqdm import tqdm
 import pandas as pd
 import numpy as np
+import pythoncom
 from pyvisa import ResourceManager
 
 from sklearn.linear_model import LinearRegression
 
 from pyoctal.instruments import FiberlabsAMP, KeysightILME
 from pyoctal.instruments.keysightPAS import export_to_omr
+from pyoctal.utils.pipeline import run_pipelined
 
 def linear_regression(data: np.array):
     """ 
@@ -79,29 +81,33 @@ def run_curr(rm: ResourceManager, amp_config: dict,
     channel for you starting from the smallest channel.
     """
     currents = np.linspace(amp_config["start"], amp_config["stop"], amp_config["step"])
+    if not len(currents):
+        raise ValueError("There are no currents to sweep.")
 
     amp = FiberlabsAMP(addr=amp_config["addr"], rm=rm)
     amp.set_ld_mode(chan=1, mode=amp_config.get("mode"))
     amp.set_all_curr(curr=0)
     amp.set_output_state(state=1)
 
+    def measure(curr):
+        amp.set_curr_smart(mode=amp_config.get("mode"), val=curr)
+        return ilme.measure()
+
+    def export(curr, result):
+        # runs while the next current is set and measured
+        wavelength, loss, omr_data = ilme.read_result(result)
+        pd.DataFrame(
+            {"Wavelength": wavelength, "Loss [dB]": loss}
+        ).to_csv(folder / f"{curr}A.csv", index=False)
+        export_to_omr(omr_data, filename=folder / f"{curr}A.omr")
+        return wavelength, loss
+
     with KeysightILME(config_path=ilme_config) as ilme:
-        # initialise a 2d loss array for model training
-        if prediction:
-            loss_2d_arr = np.zeros(shape=(ilme.get_dpts(), len(currents)))
-
-        for j, curr in tqdm(enumerate(currents), desc="Currents", total=len(currents)):
-            amp.set_curr_smart(mode=amp_config.get("mode"), val=curr)
-            ilme.start_meas()
-            wavelength, loss, omr_data = ilme.get_result()
-
-            if prediction:
-                loss_2d_arr[:,j] = loss
-
-            pd.DataFrame(
-                {"Wavelength": wavelength, "Loss [dB]": loss}
-            ).to_csv(folder / f"{curr}A.csv", index=False)
-            export_to_omr(omr_data, filename=folder / f"{curr}A.omr")
+        results = run_pipelined(tqdm(currents, desc="Currents"), measure, export,
+                                initializer=pythoncom.CoInitialize)
+        wavelength = results[-1][0]
+        # a 2d loss array for model training
+        loss_2d_arr = np.column_stack([loss for _, loss in results])
 
     if prediction:
         dpts = []
@@ -8,16 +8,15 @@ To run this script:
 python -m tools.sweeps.dc.simple_dc
 """
 from os import makedirs
-from pathlib import Path
+from os.path import join
 
 import numpy as np
 from tqdm import tqdm
 import pandas as pd
 from pyvisa import ResourceManager
-import time
 
 from pyoctal.instruments import AgilentE3640A, Agilent8164B
-from pyoctal.utils.file_operations import export_to_excel
+from pyoctal.instruments.agilent816xB import ResonanceTracker
 
 
 def run(rm: ResourceManager, pm_config: dict, pm2_config: dict, mm_config: dict, filename: str):
@@ -32,7 +31,7 @@ def run(rm: ResourceManager, pm_config: dict, pm2_config: dict, mm_config: dict,
         Power meter configuration
     mm_config: dict
         Laser/detector source configuration
-    filename: Path
+    filename: str
         The filename to save the data to
     """
     pm = AgilentE3640A(addr=pm_config["addr"], rm=rm)
@@ -43,12 +42,14 @@ def run(rm: ResourceManager, pm_config: dict, pm2_config: dict, mm_config: dict,
     powers = []
     opowers = []
     detected_voltages = []
+    resonances = []
 
     # power in linear scale
     ideal_powers = np.linspace(pm_config["start"]**2, pm_config["stop"]**2, num=pm_config["npts"])
     voltages = np.sqrt(ideal_powers)
 
-    mm.setup(reset=0, wavelength=mm_config["wavelength"], power=mm_config["power"], period=mm_config["period"])
+    # a locked detector range avoids the autorange delays at every bias point
+    mm.setup(reset=0, wavelength=mm_config["wavelength"], power=mm_config["power"], period=mm_config["period"], autorange=mm_config["autorange"])
     pm2.set_params(pm2_config["v"], 0.5)
     pm2.set_output_state(1)
     
@@ -61,21 +62,37 @@ def run(rm: ResourceManager, pm_config: dict, pm2_config: dict, mm_config: dict,
     
     pm.set_output_state(1)
 
-    for volt in tqdm(voltages, desc="DC Sweep - linear power"):
-        pm.set_volt(volt)
-
-        pm.wait_until_stable()
-        
-        # wavelength = mm.find_resonance()
-        # mm.set_wavelength(wavelength)
-        volt = pm.get_volt()
-        curr = pm.get_curr()
-        detected_voltages.append(volt)
-        currents.append(curr) # get the current value
-        powers.append(volt*curr)
-        opowers.append(mm.get_detect_pow())
-        
-    pd.DataFrame({"Voltage [V]": voltages, "Detected Voltage [V]": detected_voltages, "Current [A]": currents, "Electrical Power [W]": powers, "Optical power [W]": opowers}).to_csv(filename, index=False)
+    # follow the resonance with narrow sweeps around its predicted position
+    session = None
+    tracker = None
+    if mm_config["track"]:
+        session = mm.sweep_session(power=mm_config["power"], reset=False)
+        tracker = ResonanceTracker(mm, session, center=mm_config["wavelength"],
+                                   window=mm_config["window"], avgtime=mm_config["period"])
+
+    try:
+        for ideal_power, volt in zip(tqdm(ideal_powers, desc="DC Sweep - linear power"), voltages):
+            pm.set_volt(volt)
+
+            pm.wait_until_stable()
+
+            if tracker is not None:
+                # the thermal shift is linear in the heater power
+                resonances.append(tracker.update(ideal_power).wavelength)
+            else:
+                resonances.append(mm_config["wavelength"])
+            volt = pm.get_volt()
+            curr = pm.get_curr()
+            detected_voltages.append(volt)
+            currents.append(curr) # get the current value
+            powers.append(volt*curr)
+            opowers.append(mm.get_detect_pow())
+    finally:
+        # never leave the laser sweeping
+        if session is not None:
+            session.close()
+
+    pd.DataFrame({"Voltage [V]": voltages, "Detected Voltage [V]": detected_voltages, "Current [A]": currents, "Electrical Power [W]": powers, "Wavelength [nm]": resonances, "Optical power [W]": opowers}).to_csv(filename, index=False)
     pm.set_volt(0)
 
 
@@ -100,13 +117,16 @@ def main():
         "wavelength": 1547, # [nm]
         "power": 10, # [dBm]
         "period": 0.1, # [s]
+        "autorange": True, # False locks the range to the power at the first bias point
+        "track": False, # measure at the resonance for every bias
+        "window": 0.2, # tracking window [nm]
     }
     filename = f"{pm2_config['v']}v_g200_max_2.csv"
 
 
     folder =  r"C:\Users\Lab2052\Desktop\Users\Christina\2024-6-10\ramzi_g200"
     # check that the directory exists first, else create it.
-    makedirs(filename.parent, exist_ok=True)
+    makedirs(folder, exist_ok=True)
     rm = ResourceManager()
 
     # sweep power in linear scale by specifying voltages and number of points
@@ -6,11 +6,13 @@ from os import makedirs
 from pathlib import Path
 
 import numpy as np
+import pythoncom
 from pyvisa import ResourceManager
 from tqdm import tqdm
 
 from pyoctal.instruments import AgilentE3640A, KeysightILME
 from pyoctal.instruments.keysightPAS import export_to_omr
+from pyoctal.utils.pipeline import run_pipelined
 
 def run_ilme(rm: ResourceManager, pm_config: dict, folder: Path, ilme_config: Path=None):
     """ Run with ILME engine """
@@ -19,15 +21,19 @@ def run_ilme(rm: ResourceManager, pm_config: dict, folder: Path, ilme_config: Pa
     pm = AgilentE3640A(addr=pm_config["addr"], rm=rm)
     pm.set_output_state(1)
 
-    with KeysightILME(config_path=ilme_config) as ilme:
-        for volt in tqdm(voltages, desc="Sweeping voltages"):
-            pm.set_params(volt, 0.1)
-            pm.wait_until_stable()
+    def measure(volt):
+        pm.set_params(volt, 0.1)
+        pm.wait_until_stable()
+        return ilme.measure()
 
-            ilme.start_meas()
-            _, _, omr_data = ilme.get_result()
+    def export(volt, result):
+        # runs while the next voltage settles and is measured
+        _, _, omr_data = ilme.read_result(result)
+        export_to_omr(omr_data, folder / f"heater_{volt}V.omr")
 
-            export_to_omr(omr_data, folder / f"heater_{volt}V.omr")
+    with KeysightILME(config_path=ilme_config) as ilme:
+        run_pipelined(tqdm(voltages, desc="Sweeping voltages"), measure, export,
+                      initializer=pythoncom.CoInitialize)
 
     pm.set_volt(0)
 
@@ -46,7 +52,7 @@ def main():
     makedirs(folder, exist_ok=True)
     rm = ResourceManager()
 
-    run_ilme(rm, pm_config, folder)
+    run_ilme(rm, pm_config, Path(folder))
 
 if __name__ == "__main__":
     main()
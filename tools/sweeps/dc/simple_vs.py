@@ -6,6 +6,7 @@ import pandas as pd
 from pyvisa import ResourceManager
 
 from pyoctal.instruments import AgilentE3640A, Agilent8163B
+from pyoctal.utils.reference import ReferenceCache
 
 def run_one_source(rm: ResourceManager, pm_config: dict, mm_config: dict, folder: Path):
     """ Run only with instrument. Require one voltage source """
@@ -14,26 +15,41 @@ def run_one_source(rm: ResourceManager, pm_config: dict, mm_config: dict, folder
 
     voltages = range(pm_config["start"], pm_config["stop"]+pm_config["step"], pm_config["step"])
 
-    for volt in tqdm(voltages):
+    # configure the sweep once and only re-trigger it for every voltage
+    with mm.sweep_session(
+        power=mm_config["power"],
+        start=mm_config["start"],
+        stop=mm_config["stop"],
+        step=mm_config["step"],
+        speed=mm_config["speed"],
+        cycles=mm_config["cycles"],
+        autorange=True,
+        ) as session:
 
-        pm.set_volt(volt)
+        # normalise against a through waveguide reference measured with the same sweep
+        cache = ReferenceCache(mm_config["reference"])
+        key = cache.key_for(session)
+        normalise = key in cache
 
-        pm.wait_until_stable()
+        for volt in tqdm(voltages):
 
-        # get the loss v.s. wavelength
-        wavelengths, powers = mm.run_laser_sweep_auto(
-            power=mm_config["power"],
-            start=mm_config["start"],
-            stop=mm_config["stop"],
-            step=mm_config["step"],
-            speed=mm_config["speed"],
-            cycles=mm_config["cycles"],
-            )
+            pm.set_volt(volt)
 
-        pd.DataFrame({
-            "Wavelengths [m]": wavelengths,
-            "Power [W]": powers
-        }).to_csv(folder / f"{volt}V.csv", index=False)
+            pm.wait_until_stable()
+
+            # get the loss v.s. wavelength, averaging the cycles without outliers
+            result = session.run_averaged()
+            wavelengths, powers = result.wavelengths, result.mean
+
+            data = {
+                "Wavelengths [m]": wavelengths,
+                "Power [W]": powers
+            }
+            if result.count > 1:
+                data["Power std [W]"] = result.std
+            if normalise:
+                data["Insertion loss [dB]"] = cache.insertion_loss(key, wavelengths, powers)
+            pd.DataFrame(data).to_csv(folder / f"{volt}V.csv", index=False)
 
     pm.set_volt(0)
     pm.set_output_state(0)
@@ -55,6 +71,7 @@ def main():
         "step": 5, # [nm]
         "speed": 5, # nm/s
         "cycles": 1,
+        "reference": "references", # folder of the reference sweeps
     }
 
     folder = Path("data")